@@ -1,4 +1,24 @@
-import os, codecs, re
+import os, sys, re, bisect, threading
+from collections import ChainMap
+
+# sublime loads the plugin as '<Package>.<module>' without the package folder on sys.path while the
+# benchmarks and the command line tool import the modules directly
+if __package__:
+	from .VBScriptLibraryUtil.lrucache import LRUCache
+	from .VBScriptLibraryUtil.encoding import readLibraryText, readLibraryFile
+	from .VBScriptLibraryUtil.stats import Stats
+	from .VBScriptLibraryUtil.snapshot import LibrarySnapshot
+	from .VBScriptLibraryUtil.declarations import extractPublicDeclarations, returnFileString
+	from .VBScriptLibraryUtil.dependencies import extractImports
+	from .VBScriptLibraryUtil.workers import BackgroundParser, PRIORITY_BACKGROUND
+else:
+	from VBScriptLibraryUtil.lrucache import LRUCache
+	from VBScriptLibraryUtil.encoding import readLibraryText, readLibraryFile
+	from VBScriptLibraryUtil.stats import Stats
+	from VBScriptLibraryUtil.snapshot import LibrarySnapshot
+	from VBScriptLibraryUtil.declarations import extractPublicDeclarations, returnFileString
+	from VBScriptLibraryUtil.dependencies import extractImports
+	from VBScriptLibraryUtil.workers import BackgroundParser, PRIORITY_BACKGROUND
 #import time
 
 """ TODO
@@ -11,11 +31,20 @@ import os, codecs, re
 # \w is equivalent to [a-zA-Z0-9_] in a regex
 VBSCRIPT_VAR_NAME_PATTERN = '\\b[a-zA-Z]{1}\\w{0,254}\\b'
 
-class FileNotFoundException(Exception):
-	def __init__(self,*args,**kwargs):
-		Exception.__init__(self,*args,**kwargs)
+# types of the tokens yielded by lexVBScriptLines()
+VBSCRIPT_TOKEN_CODE = 'code'
+VBSCRIPT_TOKEN_COMMENT = 'comment'
+VBSCRIPT_TOKEN_BLANK = 'blank'
+# splits a line into string literals, the comment, ':' statement separators and the rest of the code
+VBSCRIPT_LINE_PARTS_REGEX = re.compile('"[^"]*"?|\'.*|:|[^"\':]+', re.DOTALL)
+# the '_' line continuation character has to be separated from the code before it
+VBSCRIPT_LINE_CONTINUATION_REGEX = re.compile('(^|\\s)_$')
+# the scope modifiers that can come before the keyword starting a block
+VBSCRIPT_SCOPE_MODIFIERS = frozenset(['public', 'private'])
+# returned by classifyVBScriptLine() for the lines that end the block being parsed
+VBSCRIPT_LINE_END = 'end'
 
-class FileEncodingNotFoundException(Exception):
+class FileNotFoundException(Exception):
 	def __init__(self,*args,**kwargs):
 		Exception.__init__(self,*args,**kwargs)
 
@@ -23,7 +52,12 @@ class IncorrectFileExtensionException(Exception):
 	def __init__(self,*args,**kwargs):
 		Exception.__init__(self,*args,**kwargs)
 
+# the parsed elements use __slots__ (and don't keep the regex matches or lines they were built from) 
+# as there is one instance for every variable and block in every cached library. classes that extend
+# them need to declare __slots__ too otherwise each instance gets a __dict__ again
 class VBScriptElement(object):
+	__slots__ = ()
+
 	def __init__(self):
 		pass
 
@@ -31,39 +65,29 @@ class VBScriptElement(object):
 		raise NotImplementedError(".parseLine() method not implemented by class='%s'" % self.__class__.__name__)
 
 # extended bt VBScriptVariable, VBScriptBlockFunction and VBScriptBlockPropertyGet
+# (the values are memoized by the VBScriptExpressionResolver of the global scope)
 class VBScriptCanReturnValue(object):
+	__slots__ = ()
+
 	def __init__(self):
-		self.alreadyAskedForValue = False
-		self.returnValue = None
+		pass
 
 	def getValue(self):
-		# caching of value
-		if self.alreadyAskedForValue:
-			return self.returnValue
-		self.alreadyAskedForValue = True
-
-		outputValue = self.getContents()
-		prevVals = []
-		while issubclass( outputValue.__class__, VBScriptCanReturnValue ):
-			prevVals.append(outputValue)
-			outputValue = outputValue.getContents()
-
-			# to prevent infinite recursion which can occure for example when a=b and b=a
-			if (outputValue in prevVals):
-				return None
-
-		self.returnValue = outputValue
-		return outputValue
+		variable = getValueVariable(self)
+		if variable == None:
+			return None
+		resolver = variable.globalScopeRef.getExpressionResolver()
+		return resolveWithinRecursionLimit(resolver, resolver.resolveVariable, variable)
 
 	def getContents(self):
 		raise NotImplementedError('.getContents() not implemented for the class=%s' % self.__class__.__name__)
 
 class VBScriptVariable(VBScriptElement, VBScriptCanReturnValue):
 	pattern = ( '^(?P<type>Set )?\\s*(?P<name>%s)\\s*=(?P<value>.+)$' % VBSCRIPT_VAR_NAME_PATTERN )
-	string_pattern = '"(""|[^"])*"' # needs more adding doesn't allow for escaped " chars ("""")
-	number_pattern = '([1-9][0-9]*|0)(\\.[0-9])?'
-	# \w is equivalent to [a-zA-Z0-9_]
-	call_expression_pattern = '[\\w. \\(\\),]'
+	string_pattern = '"(""|[^"])*"$'
+	number_pattern = '-?([1-9][0-9]*|0)(\\.[0-9]+)?$'
+	regex = re.compile(pattern)
+	__slots__ = ('lineNo', 'globalScopeRef', 'comment', 'name', 'valueStr', 'type')
 
 	def __init__(self, line, lineNo, comment, globalScope):
 		VBScriptElement.__init__(self)
@@ -79,28 +103,19 @@ class VBScriptVariable(VBScriptElement, VBScriptCanReturnValue):
 
 		self.comment = comment
 		groups = match.groupdict()
-		self.name = groups['name']
-		self.contentsCalculated = False
-		self.value = groups['value']
-		# used for debugging
-		self.valueStr = groups['value']
+		self.name = sys.intern(groups['name'])
+		# the source of the value which is only resolved when it's first needed
+		self.valueStr = groups['value'].strip()
 
 		# if 'Set' keyword is used then is a reference to a variable, otherwise is a copy of value
-		if ('type' in groups):
+		if (groups['type'] != None):
 			self.type = 'Reference'
 		else:
 			self.type = 'Value'
 
+	# the value the expression evaluates to in the scope of the line it's on
 	def getContents(self):
-		if not self.contentsCalculated:
-			self.contentsCalculated = True
-			print('before=%s' % self.value)
-			currentScope = self.globalScopeRef.getLineCombinedScope(self.lineNo)
-			self.parseValue(currentScope)
-			
-			print('after=%s' % self.value)
-
-		return self.value
+		return self.globalScopeRef.getExpressionResolver().resolve(self.valueStr, self.lineNo)
 
 	@classmethod
 	def isVar(cls, line):
@@ -108,18 +123,7 @@ class VBScriptVariable(VBScriptElement, VBScriptCanReturnValue):
 
 	@classmethod
 	def getMatch(cls, line):
-		return re.match(cls.pattern, line)
-
-	@classmethod
-	def formatMethodVariableName(cls, methodStr):
-		# to allow for cases like '( varname ) '
-		methodStr = methodStr.strip(' ()')
-		pos = methodStr.find('(')
-		# trims of parameters (incase of methods)
-		if pos >= 0:
-			methodStr = methodStr[:pos]
-
-		return methodStr
+		return cls.regex.match(line)
 
 	def getName(self):
 		return self.name
@@ -132,77 +136,9 @@ class VBScriptVariable(VBScriptElement, VBScriptCanReturnValue):
 	def isNumber(cls, inputValue):
 		return None != re.match( cls.number_pattern, inputValue, re.IGNORECASE )
 
-	@classmethod
-	def isCallExpression(cls, inputValue):
-		return None != re.match( cls.call_expression_pattern, inputValue, re.IGNORECASE )
-
-	# TODO - addin code for things of the form 'var.meth(param1, param2).var2' etc. (allow for dots)
-	@classmethod
-	def parseSingleExpression(cls, inputValue, scope):
-		formattedValue = cls.formatMethodVariableName(inputValue)
-		# if is a string
-		if cls.isString(formattedValue):
-			return formattedValue[1:-1]
-		# if is a number
-		elif cls.isNumber(formattedValue):
-			return float(formattedValue)
-		# case for variable/methods and classes (with possible calls to sub methods etc.)
-		elif cls.isCallExpression(formattedValue):
-			callStack = formattedValue.split('.')
-			print(callStack)
-			#########################################################################################
-			# TODO - finish this code too tired at the moment (parseSingleExpression and parseExpression)
-			#########################################################################################
-
-			for i in range(len(callStack)):
-				call = cls.formatMethodVariableName(callStack[i])
-				output = scope
-
-				# only classes can have sub properties and methods
-				if ( i < (len(callStack)-1) ):
-					# if value is variable that is defined in the current scope
-					if output.containsVariable(call):
-						output = output.getVariable(call).getValue()
-					# if value is code block (class or method) that is defined in the current scope
-					elif output.containsSubBlock(call):
-						output = output.getSubBlock(call)
-				# if last element in the call stack then doesn't need to be a class
-				elif (i == (len(callStack) - 1)):
-					# if value is variable that is defined in the current scope
-					if output.containsVariable(call):
-						output = output.getVariable(call)
-					# if value is code block (class or method) that is defined in the current scope
-					elif output.containsSubBlock(call):
-						output = output.getSubBlock(call)
-					else:
-						return None
-					return output
-				else:
-					return None
-		
-		# if unknown return None
-		return None
-
-	@classmethod
-	def parseExpression(cls, inputValue, scope):
-		formattedValue = cls.formatMethodVariableName(inputValue)
-		callStack = formattedValue.split('.')
-		print("callstack=%s" % callStack)
-		# TODO - finish this code too tired at the moment
-		
-		for i in range(len(callStack)):
-			call = cls.formatMethodVariableName(callStack[i])
-			output = scope
-
-			output = cls.parseSingleExpression(call, output)
-		
-		return output
-
-	def parseValue(self, scope):
-		self.value = self.parseExpression(self.value, scope)
-
 class VBScriptParameter(VBScriptElement):
 	pattern = ( '^(?P<type>ByVal |ByRef )?\\s*(?P<name>%s)$' % VBSCRIPT_VAR_NAME_PATTERN)
+	__slots__ = ('name', 'type')
 
 	def __init__(self, line):
 		VBScriptElement.__init__(self)
@@ -213,11 +149,11 @@ class VBScriptParameter(VBScriptElement):
 				(self.__class__.__name__, line))
 
 		groups = match.groupdict()
-		self.name = groups['name']
+		self.name = sys.intern(groups['name'])
 
-		# if 'Set' keyword is used then is a reference to a variable, otherwise is a copy of value
-		if ('type' in groups):
-			self.type = groups['type']
+		# parameters are passed by reference unless ByVal is used
+		if (groups['type'] != None):
+			self.type = sys.intern(groups['type'].strip())
 		else:
 			self.type = 'ByRef'
 
@@ -230,17 +166,18 @@ class VBScriptParameter(VBScriptElement):
 		return re.match(cls.pattern, line)
 
 class VBScriptScope(VBScriptElement):
+	__slots__ = ('scopeRange', 'variables', 'blocks')
+
 	def __init__(self):
 		self.scopeRange = None
 		# of the form {name:varClassInstance, ...}
 		self.variables = {}
 		# of the form {identifier:scriptBlockClassInstance, ...}
 		self.blocks = {}
-		self.ended = False
 
 	@classmethod
 	def formatKey(cls, key):
-		return key.lower()
+		return sys.intern(key.lower())
 
 	def addVariable(self, var):
 		name = self.formatKey(var.getName())
@@ -255,16 +192,6 @@ class VBScriptScope(VBScriptElement):
 		else:
 			self.blocks[name] = block
 
-	# used when build a combined scope
-	# will overwrite variables and methods with the ones in the new scope if there are clashes
-	def addScope(self, scope):
-		# adds the variables
-		for name, var in scope.variables.iteritems():
-			self.variables[name] = var
-		# adds the sub-blocks
-		for identifier, block in scope.blocks.iteritems():
-			self.blocks[identifier] = block
-
 	def containsVariable(self, name):
 		return self.formatKey(name) in self.variables
 
@@ -283,30 +210,25 @@ class VBScriptScope(VBScriptElement):
 	def getSubBlocks(self):
 		return self.blocks.values()
 
+	# scopes are parsed whole apart from the bodies of methods (see VBScriptBlockMethod.parseBody())
+	def parseBody(self):
+		pass
+
 	def getLineCombinedScope(self, line):
 		scopes = [self]
 		
 		for scope in scopes:
 			for block in scope.getSubBlocks():		
-				if issubclass(VBScriptScopeGlobal, block.__class__):
-					scopes.append(block)
-				elif block.lineInScope(line):
+				if block.lineInScope(line):
 					scopes.append(block)
-		
-		
-		print('line=%s scopes=%r' % (line, map(lambda x:x.__class__, scopes)))
-		outputScope = VBScriptScope()
-		for scope in scopes:
-			outputScope.addScope(scope)
 
-		return outputScope
+		return combineScopes(scopes)
 
 	@classmethod
 	def getNewScope(cls, line, comment, lineNo):
-		for scope in VBSCRIPT_NON_GLOBAL_SCOPE_CLASSES:
-			if scope.isStart(line):
-				return scope(line, comment, lineNo)
-
+		scopeClass = getBlockStartClass(line)
+		if (scopeClass != None) and scopeClass.isStart(line):
+			return scopeClass(line, comment, lineNo)
 		return None
 
 	def hasEnded(self):
@@ -321,18 +243,19 @@ class VBScriptScope(VBScriptElement):
 		return (scopeRange != None) and (line in scopeRange)
 
 	def parseLine(self, line, comment, lineNo, globalScope):
-		if self.isEnd(line):
+		lineClass = classifyVBScriptLine(line, self)
+		if lineClass == VBSCRIPT_LINE_END:
 			self.scopeRange = range(self.startLineNumber + 1, lineNo)
 			return None
 
 		# see if is the start of a new scope
-		newScope = VBScriptScope.getNewScope(line, comment, lineNo)
-		if None != newScope:
+		if lineClass in VBSCRIPT_NON_GLOBAL_SCOPE_CLASSES:
+			newScope = lineClass(line, comment, lineNo)
 			self.addSubBlock(newScope)
 			return newScope
 
 		# see if line is a variable
-		if VBScriptVariable.isVar(line):
+		if lineClass == VBScriptVariable:
 			var = VBScriptVariable(line, lineNo, comment, globalScope)
 			self.addVariable(var)
 			return None
@@ -348,45 +271,140 @@ class VBScriptScope(VBScriptElement):
 		raise NotImplementedError('.getName() methods has not been implemented for the class=%s' % self.__class__.__name__)
 
 class VBScriptScopeGlobal(VBScriptScope):
+	__slots__ = ('scopeIndex', 'expressionResolver', 'path')
+
 	def __init__(self):
 		VBScriptScope.__init__(self)
+		# both built the first time they're needed (need resetting if the blocks are changed after parsing)
+		self.scopeIndex = None
+		self.expressionResolver = None
+		# the file the text was parsed from (used to find the libraries it imports) or None if unknown
+		self.path = None
+
+	# uses the nesting index of the blocks instead of checking every block
+	def getLineCombinedScope(self, line):
+		return self.getScopeIndex().getLineCombinedScope(line)
+
+	def getScopeIndex(self):
+		if self.scopeIndex == None:
+			self.scopeIndex = VBScriptScopeIndex(self)
+		return self.scopeIndex
+
+	def getExpressionResolver(self):
+		if self.expressionResolver == None:
+			self.expressionResolver = VBScriptExpressionResolver(self)
+		return self.expressionResolver
+
+	# returns the value of an expression (e.g. 'obj.getThing(1, "x").prop') at the line
+	def resolveExpression(self, expression, line):
+		return self.getExpressionResolver().resolve(expression, line)
+
+	# the memoized values are dropped along with the index as they refer to the old blocks
+	def resetScopeIndex(self):
+		self.scopeIndex = None
+		self.expressionResolver = None
 
 	@classmethod
 	def isEnd(cls, line):
 		# line is never the end of the global scope
 		return False
 
+# sorted index of the nested blocks of a global scope so that the blocks containing a line are found 
+# with a binary search (blocks are either nested or don't overlap so the innermost block containing a 
+# line is always the last block starting before it or one of the blocks it's nested in)
+class VBScriptScopeIndex(object):
+	def __init__(self, globalScope):
+		self.globalScope = globalScope
+		# the first line in each block, the blocks and the position of the block each is nested in (or -1)
+		self.starts = []
+		self.blocks = []
+		self.parents = []
+		self.addBlocks(globalScope, -1)
+		# combined scopes already built of the form {innermostBlockPos:VBScriptScopeInstance, ...}
+		self.combinedScopes = {}
+
+	def addBlocks(self, scope, parentPos):
+		for block in scope.getSubBlocks():
+			if block.getScopeRange() == None:
+				continue
+			self.starts.append(block.getScopeRange().start)
+			self.blocks.append(block)
+			self.parents.append(parentPos)
+			self.addBlocks(block, len(self.blocks) - 1)
+
+	# returns the position of the innermost block containing the line (or -1 if only the global scope does)
+	def getInnermostBlockPos(self, line):
+		pos = bisect.bisect_right(self.starts, line) - 1
+		while (pos >= 0) and not (self.blocks[pos].lineInScope(line)):
+			pos = self.parents[pos]
+		return pos
+
+	def getLineCombinedScope(self, line):
+		return self.getCombinedScope(self.getInnermostBlockPos(line))
+
+	def getCombinedScope(self, pos):
+		if pos in self.combinedScopes:
+			return self.combinedScopes[pos]
+
+		scopes = []
+		blockPos = pos
+		while blockPos >= 0:
+			scopes.insert(0, self.blocks[blockPos])
+			blockPos = self.parents[blockPos]
+		scopes.insert(0, self.globalScope)
+
+		self.combinedScopes[pos] = combineScopes(scopes)
+		return self.combinedScopes[pos]
+
+	# returns the class that the block is in (or is) or None if it isn't in one
+	def getEnclosingClass(self, pos):
+		while pos >= 0:
+			if isinstance(self.blocks[pos], VBScriptBlockClass):
+				return self.blocks[pos]
+			pos = self.parents[pos]
+		return None
+
 # inherited by all scopes apart from the global scope
 class VBScriptBlock(VBScriptScope):
 	SCOPE_MODIFIERS_PATTERN = '(\\bpublic\\b|\\bprivate\\b)?'
 	startPattern = None
 	endPattern = None
+	# the patterns compiled (with re.IGNORECASE) by compilePatterns()
+	startRegex = None
+	endRegex = None
+	__slots__ = ('startLineNumber', 'comment', 'scope', 'name')
 
 	def __init__(self, blockStartLine, comment, lineNo):
 		VBScriptScope.__init__(self)
 
-		# instance variable as other constructor may wish to do more with it
-		self.match = self.matchStart(blockStartLine)
+		match = self.matchStart(blockStartLine)
 
-		if self.match == None:
+		if match == None:
 			raise ValueError("'Could not construct class='%s' from line='%s'" % \
 				(self.__class__.__name__, blockStartLine))
 
 		self.startLineNumber = lineNo
 		self.comment = comment
-		groups = self.match.groupdict()
+		self.setupFromStart(match.groupdict())
 
-		if 'scope' in groups:
-			self.scope = groups['scope']
+	# sets up the block from the groups of the start pattern (other constructors may wish to do more with it)
+	def setupFromStart(self, groups):
+		if groups.get('scope'):
+			self.scope = sys.intern(groups['scope'])
 		else:
 			# default scope is Public
 			self.scope = 'Public'
 
-		self.name = groups['name']
+		self.name = sys.intern(groups['name'])
+
+	@classmethod
+	def compilePatterns(cls):
+		cls.startRegex = re.compile(cls.startPattern, re.IGNORECASE)
+		cls.endRegex = re.compile(cls.endPattern, re.IGNORECASE)
 
 	@classmethod
 	def matchStart(cls, line):
-		return re.match(cls.startPattern, line, re.IGNORECASE)
+		return cls.startRegex.match(line)
 
 	@classmethod
 	def isStart(cls, line):
@@ -394,7 +412,7 @@ class VBScriptBlock(VBScriptScope):
 
 	@classmethod
 	def isEnd(cls, line):
-		return (None != re.match(cls.endPattern, line, re.IGNORECASE))
+		return (None != cls.endRegex.match(line))
 
 	def getName(self):
 		return self.name
@@ -404,6 +422,7 @@ class VBScriptBlockClass(VBScriptBlock):
 	startPattern = ( '^(?P<scope>%s)\\s*\\bClass\\b\\s+(?P<name>%s)$' % \
 		(VBScriptBlock.SCOPE_MODIFIERS_PATTERN, VBSCRIPT_VAR_NAME_PATTERN) )
 	endPattern = ( '^\\bEnd\\b\\s+\\bClass\\b$' )
+	__slots__ = ()
 
 	def __init__(self, blockStartLine, comment, lineNo):
 		VBScriptBlock.__init__(self, blockStartLine, comment, lineNo)
@@ -413,14 +432,58 @@ class VBScriptBlockMethod(VBScriptBlock):
 	METHOD_SINGLE_PARAM_PATTERN = ( '\\s*(%s)?\\s*(%s)\\s*' % (PARAMS_TYPE_PATTERN, VBSCRIPT_VAR_NAME_PATTERN) )
 	METHOD_PARAMS_PATTERN = ( '\\((%s,)*(%s)?\\)' % \
 		(METHOD_SINGLE_PARAM_PATTERN, METHOD_SINGLE_PARAM_PATTERN) )
+	# held while a body is parsed so that the variables of a half parsed body are never used
+	bodyLock = threading.Lock()
+	__slots__ = ('params', 'body')
 
 	def __init__(self, blockStartLine, comment, lineNo):
 		VBScriptBlock.__init__(self, blockStartLine, comment, lineNo)
+		# the text of the body when it hasn't been parsed yet of the form (text, firstLineNo, comment, 
+		# globalScope) (completions only need the signatures so the bodies are parsed the first time 
+		# their variables are used, see skipMethodBody())
+		self.body = None
+
+	# the lines are kept as a single string as it uses a lot less memory than a list of them
+	def setBody(self, lines, firstLineNo, comment, globalScope):
+		self.body = ('\n'.join(lines), firstLineNo, comment, globalScope)
+
+	def isBodyParsed(self):
+		return (self.body == None)
+
+	def parseBody(self):
+		if self.body == None:
+			return
+		with self.bodyLock:
+			if self.body == None:
+				return
+			text, firstLineNo, comment, globalScope = self.body
+			with Stats.timer('parse body'):
+				parseVBScriptTokens(lexVBScriptLines(text.split('\n'), firstLineNo), globalScope, self, \
+					comment=comment)
+			self.body = None
+
+	# moves the body that hasn't been parsed yet when lines before it are added or removed
+	def shiftBody(self, afterLine, lineShift):
+		text, firstLineNo, comment, globalScope = self.body
+		if firstLineNo > afterLine:
+			self.body = (text, firstLineNo + lineShift, comment, globalScope)
 
-		groups = self.match.groupdict()
+	def containsVariable(self, name):
+		self.parseBody()
+		return VBScriptBlock.containsVariable(self, name)
+
+	def getVariable(self, name):
+		self.parseBody()
+		return VBScriptBlock.getVariable(self, name)
+
+	def getVariables(self):
+		self.parseBody()
+		return VBScriptBlock.getVariables(self)
+
+	def setupFromStart(self, groups):
+		VBScriptBlock.setupFromStart(self, groups)
 
 		if 'params' in groups:
-			# TODO add code to parse the parameters
 			self.params = self.getParams( groups['params'] )
 		else:
 			self.params = []
@@ -452,6 +515,8 @@ class VBScriptBlockMethod(VBScriptBlock):
 		return self.name
 
 class VBScriptBlockFunction(VBScriptBlockMethod, VBScriptCanReturnValue):
+	__slots__ = ()
+
 	def __init__(self, blockStartLine, comment, lineNo):
 		VBScriptBlockMethod.__init__(self, blockStartLine, comment, lineNo)
 		VBScriptCanReturnValue.__init__(self)
@@ -469,6 +534,8 @@ class VBScriptBlockFunction(VBScriptBlockMethod, VBScriptCanReturnValue):
 			return None
 
 class VBScriptBlockSub(VBScriptBlockMethod):
+	__slots__ = ()
+
 	def __init__(self, blockStartLine, comment, lineNo):
 		VBScriptBlockMethod.__init__(self, blockStartLine, comment, lineNo)
 
@@ -479,6 +546,8 @@ class VBScriptBlockSub(VBScriptBlockMethod):
 		cls.setEndPattern("\\bSub\\b")
 
 class VBScriptBlockPropertyGet(VBScriptBlockMethod, VBScriptCanReturnValue):
+	__slots__ = ()
+
 	def __init__(self, blockStartLine, comment, lineNo):
 		VBScriptBlockMethod.__init__(self, blockStartLine, comment, lineNo)
 		VBScriptCanReturnValue.__init__(self)
@@ -496,6 +565,8 @@ class VBScriptBlockPropertyGet(VBScriptBlockMethod, VBScriptCanReturnValue):
 			return None
 
 class VBScriptBlockPropertyLet(VBScriptBlockMethod):
+	__slots__ = ()
+
 	def __init__(self, blockStartLine, comment, lineNo):
 		VBScriptBlockMethod.__init__(self, blockStartLine, comment, lineNo)
 
@@ -506,6 +577,8 @@ class VBScriptBlockPropertyLet(VBScriptBlockMethod):
 		cls.setEndPattern("\\bProperty\\b")
 
 class VBScriptBlockPropertySet(VBScriptBlockMethod):
+	__slots__ = ()
+
 	def __init__(self, blockStartLine, comment, lineNo):
 		VBScriptBlockMethod.__init__(self, blockStartLine, comment, lineNo)		
 		
@@ -524,28 +597,470 @@ VBScriptBlockPropertySet.setupPatterns()
 
 VBSCRIPT_NON_GLOBAL_SCOPE_CLASSES = [VBScriptBlockClass, VBScriptBlockFunction, VBScriptBlockSub, \
 	VBScriptBlockPropertyGet, VBScriptBlockPropertyLet, VBScriptBlockPropertySet]
+for scopeClass in VBSCRIPT_NON_GLOBAL_SCOPE_CLASSES:
+	scopeClass.compilePatterns()
+
+# the class of the block started by the lines with the keywords (after any scope modifier), every 
+# start pattern begins with one of them followed by a space
+VBSCRIPT_BLOCK_START_CLASSES = {'class':VBScriptBlockClass, 'function':VBScriptBlockFunction, \
+	'sub':VBScriptBlockSub, 'property get':VBScriptBlockPropertyGet, 'property let':VBScriptBlockPropertyLet, \
+	'property set':VBScriptBlockPropertySet}
+
+# classifies a line of code from its first words so only one pattern is matched against most lines 
+# (instead of the end pattern, all six start patterns and the variable pattern). endingScope is the 
+# scope (or class of block) being parsed. returns VBSCRIPT_LINE_END if the line ends it, the class 
+# of the block the line starts, VBScriptVariable if it's an assignment or None for any other line
+def classifyVBScriptLine(line, endingScope):
+	words = line.split(None, 1)
+	if len(words) == 0:
+		return None
+	if words[0].lower() == 'end':
+		if endingScope.isEnd(line):
+			return VBSCRIPT_LINE_END
+	else:
+		scopeClass = getBlockStartClass(line, words)
+		if (scopeClass != None) and scopeClass.isStart(line):
+			return scopeClass
+
+	# all variables are assigned with '='
+	if ('=' in line) and VBScriptVariable.isVar(line):
+		return VBScriptVariable
+	return None
+
+# returns the class of the block the line would start if it matches its start pattern (or None if it
+# can't start one), words is the line split at its first space if it's already been split
+def getBlockStartClass(line, words=None):
+	if words == None:
+		words = line.split(None, 1)
+	if len(words) == 0:
+		return None
+	keyword = words[0].lower()
+	if (keyword in VBSCRIPT_SCOPE_MODIFIERS) and (len(words) > 1):
+		words = words[1].split(None, 1)
+		keyword = words[0].lower()
+	if (keyword == 'property') and (len(words) > 1):
+		keyword = 'property %s' % words[1].split(None, 1)[0].lower()
+	return VBSCRIPT_BLOCK_START_CLASSES.get(keyword)
+
+# builds a single scope from a list of nested scopes (outermost first) where the variables and 
+# methods of the inner scopes replace the ones in the outer scopes when the names clash
+def combineScopes(scopes):
+	return VBScriptScopeView(scopes)
+
+# read only view of nested scopes used as a combined scope. the names are looked up in the scopes' 
+# own dictionaries from the innermost scope out so nothing is copied to build it
+class VBScriptScopeView(object):
+	__slots__ = ('scopes', 'variables', 'blocks')
+
+	# scopes should be outermost first
+	def __init__(self, scopes):
+		for scope in scopes:
+			scope.parseBody()
+		self.scopes = scopes
+		innermostFirst = list(reversed(scopes))
+		self.variables = ChainMap(*[scope.variables for scope in innermostFirst])
+		self.blocks = ChainMap(*[scope.blocks for scope in innermostFirst])
+
+	def containsVariable(self, name):
+		return VBScriptScope.formatKey(name) in self.variables
+
+	def getVariable(self, name):
+		return self.variables[ VBScriptScope.formatKey(name) ]
+
+	def getVariables(self):
+		return self.variables.values()
+
+	def containsSubBlock(self, name):
+		return VBScriptScope.formatKey(name) in self.blocks
+
+	def getSubBlock(self, name):
+		return self.blocks[ VBScriptScope.formatKey(name) ]
+
+	def getSubBlocks(self):
+		return self.blocks.values()
+
+# splits an expression into its member accesses e.g. ['a', 'b(1, "x.y")', 'c'] for 'a.b(1, "x.y").c'
+def splitMemberAccesses(expression):
+	parts = []
+	depth = 0
+	inString = False
+	start = 0
+	for pos in range(len(expression)):
+		char = expression[pos]
+		if char == '"':
+			# escaped quotes ("") just toggle twice
+			inString = not inString
+		elif inString:
+			continue
+		elif char == '(':
+			depth += 1
+		elif char == ')':
+			depth -= 1
+		elif (char == '.') and (depth == 0):
+			parts.append(expression[start:pos].strip())
+			start = pos + 1
+	parts.append(expression[start:].strip())
+	return parts
+
+# removes the parentheses around the whole expression e.g. 'a' for '((a))' (but not for '(a) + (b)')
+def stripEnclosingParentheses(expression):
+	while expression.startswith('(') and (getClosingParenthesisPos(expression) == len(expression) - 1):
+		expression = expression[1:-1].strip()
+	return expression
+
+# returns the position of the parenthesis closing the one at the start of the expression (-1 if it isn't closed)
+def getClosingParenthesisPos(expression):
+	depth = 0
+	inString = False
+	for pos in range(len(expression)):
+		char = expression[pos]
+		if char == '"':
+			inString = not inString
+		elif inString:
+			continue
+		elif char == '(':
+			depth += 1
+		elif char == ')':
+			depth -= 1
+			if depth == 0:
+				return pos
+	return -1
+
+# returns the name being accessed without the arguments e.g. 'getThing' for 'getThing(1, "x")' 
+# (None if it isn't a name)
+def getAccessedName(part):
+	pos = part.find('(')
+	if pos != -1:
+		part = part[:pos]
+	part = part.strip()
+	if re.match('^%s$' % VBSCRIPT_VAR_NAME_PATTERN, part) == None:
+		return None
+	return part
+
+# returns the value of a variable, function or property get (None for anything else)
+def getElementValue(element):
+	variable = getValueVariable(element)
+	if variable == None:
+		return None
+	return variable.globalScopeRef.getExpressionResolver().resolveVariable(variable)
+
+# returns the variable holding the value of the element, functions and property gets return the 
+# variable with their name (None for anything else)
+def getValueVariable(element):
+	if isinstance(element, VBScriptVariable):
+		return element
+	elif isinstance(element, VBScriptCanReturnValue):
+		return element.getContents()
+	return None
+
+# works out what expressions evaluate to, the class blocks for objects (e.g. 'New Cls', 'lib.Factory()' 
+# and chained property and function returns), the global scopes of imported libraries (e.g. 
+# 'Import("lib")'), strings and numbers (None if it's unknown). the values 
+# are memoized for each scope and expression and the resolver is replaced when the global scope 
+# changes (a new version of the library is a new global scope)
+#
+# the variables whose value is just another variable, function or property (e.g. 'Set a = b' or 
+# 'Set a = (b)') make a graph where each variable refers to at most one other. these chains are 
+# followed without recursing (so they can be any length) and the value at the end is stored for 
+# every variable on the way (any variable leading into a cycle is None). only the other expressions 
+# are evaluated (their first access is followed in the graph in the same way) so a chain of them 
+# (e.g. 'Set a = b.c') is recursed and is None once it's nested deeper than python allows
+class VBScriptExpressionResolver(object):
+	NEW_PATTERN = ( '^\\bNew\\b\\s+(?P<name>%s)$' % VBSCRIPT_VAR_NAME_PATTERN )
+	IMPORT_PATTERN = '^\\bImport\\s*\\(\\s*"(?P<path>[a-zA-Z0-9\\.\\\\/]+)\\s*"\\s*\\)$'
+
+	def __init__(self, globalScope):
+		self.globalScope = globalScope
+		# of the form {(innermostBlockPos, expression):value, ... } where the block position identifies 
+		# the combined scope in the global scope's VBScriptScopeIndex
+		self.values = {}
+		# of the form {VBScriptVariableInstance:value, ... }
+		self.variableValues = {}
+		# of the form {VBScriptBlockClassInstance:ChainMapInstance, ... } (see getClassMembers())
+		self.classMembers = {}
+
+	# resolves the value of every variable in the library (each is only visited once)
+	def resolveAll(self):
+		scopes = [self.globalScope] + self.globalScope.getScopeIndex().blocks
+		for scope in scopes:
+			for variable in scope.getVariables():
+				resolveWithinRecursionLimit(self, self.resolveVariable, variable)
+
+	# follows the chain of variables from the variable until one whose value is known or has to be 
+	# evaluated (or a variable already in the chain) and stores the value for the whole chain
+	def resolveVariable(self, variable):
+		chain = []
+		inChain = set()
+		while True:
+			if variable in self.variableValues:
+				value = self.variableValues[variable]
+				break
+			if variable in inChain:
+				value = None
+				break
+			chain.append(variable)
+			inChain.add(variable)
+
+			isVariable, target = self.getReference(variable)
+			if not isVariable:
+				value = target
+				break
+			variable = target
+
+		for variable in chain:
+			self.variableValues[variable] = value
+		return value
+
+	# returns the tuple (True, variable) if the variable's value is the value of another variable, 
+	# otherwise (False, value) with the value of its expression
+	def getReference(self, variable):
+		# e.g. 'Set a = (b)' refers to b in the same way as 'Set a = b'
+		expression = stripEnclosingParentheses(variable.valueStr)
+		blockPos = self.globalScope.getScopeIndex().getInnermostBlockPos(variable.lineNo)
+		parts = splitMemberAccesses(expression)
+		if (len(parts) > 1) or parts[0].startswith('(') or VBScriptVariable.isString(expression) \
+			or VBScriptVariable.isNumber(expression):
+			return False, self.resolveInBlock(expression, blockPos)
+
+		name = getAccessedName(parts[0])
+		if (name == None) or (name.lower() in ('import', 'me')):
+			# e.g. 'New Cls', 'a + b', 'Import("lib")' or 'Me'
+			return False, self.resolveInBlock(expression, blockPos)
+		target = getValueVariable(self.findAccessedElement(name, blockPos))
+		if target == None:
+			return False, None
+		return True, target
+
+	def resolve(self, expression, line):
+		return resolveWithinRecursionLimit(self, self.resolveInBlock, expression, \
+			self.globalScope.getScopeIndex().getInnermostBlockPos(line))
+
+	# the values stored while following an expression that was nested too deeply were left unfinished
+	# (as None) so everything is worked out again
+	def clearValues(self):
+		self.values = {}
+		self.variableValues = {}
+
+	def resolveInBlock(self, expression, blockPos):
+		key = (blockPos, expression.strip())
+		if key in self.values:
+			return self.values[key]
+
+		# stops cycles (e.g. a = b and b = a) being followed forever as they resolve to None
+		self.values[key] = None
+		value = self.evaluate(key[1], blockPos)
+		self.values[key] = value
+		return value
+
+	def evaluate(self, expression, blockPos):
+		if VBScriptVariable.isString(expression):
+			return expression[1:-1].replace('""', '"')
+		elif VBScriptVariable.isNumber(expression):
+			return float(expression)
+
+		scope = self.globalScope.getScopeIndex().getCombinedScope(blockPos)
+		match = re.match(self.NEW_PATTERN, expression, re.IGNORECASE)
+		if match != None:
+			name = match.group('name')
+			if scope.containsSubBlock(name) and isinstance(scope.getSubBlock(name), VBScriptBlockClass):
+				return scope.getSubBlock(name)
+			return None
+
+		parts = splitMemberAccesses(expression)
+		value = self.evaluateFirstAccess(parts[0], blockPos, scope)
+		for part in parts[1:]:
+			name = getAccessedName(part)
+			if name == None:
+				return None
+			value = getElementValue(self.getMember(value, name))
+		return value
+
+	def evaluateFirstAccess(self, part, blockPos, scope):
+		# e.g. '(New Cls)'
+		if part.startswith('(') and part.endswith(')'):
+			return self.resolveInBlock(part[1:-1], blockPos)
+
+		match = re.match(self.IMPORT_PATTERN, part, re.IGNORECASE)
+		if match != None:
+			return self.getImportedScope(match.group('path'))
+
+		name = getAccessedName(part)
+		if name == None:
+			return None
+		elif name.lower() == 'me':
+			return self.globalScope.getScopeIndex().getEnclosingClass(blockPos)
+		return getElementValue(self.findAccessedElement(name, blockPos, scope))
+
+	# returns the global scope of the imported library if its current version has already been 
+	# parsed (it's never stat'ed, read or parsed here as this is used on the completion path)
+	def getImportedScope(self, relativePath):
+		if self.globalScope.path == None:
+			return None
+		scopes = LibraryDetailsCache.getSnapshotDetails(LibraryDetailsCache.resolveImportPath(self.globalScope.path, \
+			relativePath))
+		if scopes == None:
+			return None
+		return scopes[0]
+
+	# returns the variable or block the name refers to in the block (or None)
+	def findAccessedElement(self, name, blockPos, scope=None):
+		if scope == None:
+			scope = self.globalScope.getScopeIndex().getCombinedScope(blockPos)
+		if scope.containsVariable(name):
+			return scope.getVariable(name)
+		elif scope.containsSubBlock(name):
+			return scope.getSubBlock(name)
+
+		# the fields of a class are set in its methods (normally Class_Initialize)
+		classBlock = self.globalScope.getScopeIndex().getEnclosingClass(blockPos)
+		if classBlock != None:
+			return self.getClassMember(classBlock, name)
+		return None
+
+	# returns the member of an object (a class block) or of an imported library (its global scope)
+	# with the name (None for anything else)
+	def getMember(self, value, name):
+		if isinstance(value, VBScriptBlockClass):
+			return self.getClassMember(value, name)
+		elif isinstance(value, VBScriptScopeGlobal):
+			if value.containsVariable(name):
+				return value.getVariable(name)
+			elif value.containsSubBlock(name):
+				return value.getSubBlock(name)
+		return None
+
+	# returns the method, property or field of the class with the name (or None)
+	def getClassMember(self, classBlock, name):
+		members = self.classMembers.get(classBlock)
+		if members == None:
+			members = getClassMembers(classBlock)
+			self.classMembers[classBlock] = members
+		return members.get(VBScriptScope.formatKey(name))
+
+# RecursionError was only added in python 3.5 (it's a RuntimeError before then)
+try:
+	RecursionLimitError = RecursionError
+except NameError:
+	RecursionLimitError = RuntimeError
+
+# calls the function of the resolver returning None if the values are nested deeper than python's 
+# recursion limit allows
+def resolveWithinRecursionLimit(resolver, function, *args):
+	try:
+		return function(*args)
+	except RecursionLimitError:
+		resolver.clearValues()
+		return None
+
+# returns a ChainMap of the methods, properties and fields of the class by their formatted names.
+# fields are assigned in the methods of the class with Class_Initialize checked first (a method's 
+# variable with the method's name is its return value so isn't a field)
+def getClassMembers(classBlock):
+	fields = {}
+	methods = sorted(classBlock.getSubBlocks(), key=lambda block: block.getName().lower() != 'class_initialize')
+	for method in methods:
+		methodKey = method.formatKey(method.getName())
+		for var in method.getVariables():
+			key = method.formatKey(var.getName())
+			if (key != methodKey) and not (key in fields):
+				fields[key] = var
+	return ChainMap(classBlock.blocks, classBlock.variables, fields)
 
 # classes used to store and extract library details
+# the memory used for each byte of the library once it's parsed (while the method bodies are unparsed)
+LIBRARY_DETAILS_BYTES_PER_FILE_BYTE = 4
+
+# everything that is built from one version of a library file. it's shared by the completions 
+# (the public methods and properties), the persistent index (the scope ranges), the dependency graph 
+# (the imports) and the expression resolver (the scopes) so the file is read once per change. the 
+# declarations and imports are found by scanning the text (not from the scopes) and each of them is
+# only built the first time it's needed. once the text has been parsed whatever hasn't been built 
+# yet is built too and the text is dropped (so the cached details don't keep it)
 class LibraryDetails(object):
 	def __init__(self, path, useRelativePath=False):
 		if useRelativePath:
 			path = LibraryDetailsCache.getLibraryPath(path)
 
 		self.path = path
-		self.file_last_modified = os.path.getmtime(path)
-		self.contents = parseVBScriptLibrary(path)
-
-	def getLastModified(self):
-		return self.file_last_modified
-
+		self.text, self.stamp = readLibraryFile(path)
+		# the scopes as returned by parseVBScriptText() (or the message of the ValueError raised 
+		# when the library couldn't be parsed)
+		self.contents = None
+		self.parseError = None
+		# the tuple (methods, properties) returned by extractPublicDeclarations()
+		self.declarations = None
+		# the dictionary returned by extractImports()
+		self.imports = None
+		# the details are built on the background parser threads and used from sublime's
+		self.lock = threading.Lock()
+
+	# true if the file still has the contents that were parsed (only reads the file if its last
+	# modified time has changed and the size hasn't)
+	def isCurrent(self):
+		return self.stamp.matchesFile(self.path)
+
+	# rough estimate of the memory used by the parsed library (measured with benchmarks/run.py)
+	def getEstimatedSize(self):
+		return self.stamp.size * LIBRARY_DETAILS_BYTES_PER_FILE_BYTE
+
+	# raises a ValueError if the library has unclosed blocks
 	def getContents(self):
+		with self.lock:
+			if (self.contents == None) and (self.parseError == None):
+				try:
+					self.contents = parseVBScriptText(self.text)
+					self.contents[0].path = self.path
+				except ValueError as e:
+					self.parseError = str(e)
+				self.buildDeclarations()
+				self.buildImports()
+				self.text = None
+		if self.parseError != None:
+			raise ValueError(self.parseError)
 		return self.contents
 
+	# the line ranges of the blocks (see getScopeRanges()), libraries with unclosed blocks have none
+	def getScopeRanges(self):
+		try:
+			return getScopeRanges(self.getContents())
+		except ValueError:
+			return []
+
+	# the message of the ValueError raised when the library couldn't be parsed (None if it could)
+	def getParseError(self):
+		try:
+			self.getContents()
+		except ValueError as e:
+			return 'ValueError: %s' % e
+		return None
+
+	# the (methods, properties) tuple of the public declarations shown in the completions
+	def getPublicDeclarations(self):
+		with self.lock:
+			self.buildDeclarations()
+			return self.declarations
+
+	# the dictionary of the variables and the relative paths of the libraries they import
+	def getImports(self):
+		with self.lock:
+			self.buildImports()
+			return self.imports
+
+	# (only called while holding the lock)
+	def buildDeclarations(self):
+		if self.declarations == None:
+			self.declarations = extractPublicDeclarations(self.path, self.text)
+
+	def buildImports(self):
+		if self.imports == None:
+			self.imports = extractImports(returnFileString(self.path, self.text))
+
 class LibraryDetailsCache(object):
 	LIBRARY_PARENT_FOLDER = '\\TestLibrary\\'
 	POSSIBLE_SCRIPT_PARENT_FOLDERS = ['\\TestLibrary\\', '\\RegressionControl\\']
 	librariesDirPath = None
-	libraries = {}
+	# should be of the form {path:LibraryDetailsClassInstance, ... } (the limits are set by the plugin settings)
+	libraries = LRUCache(sizeOf=lambda libDetails: libDetails.getEstimatedSize())
 
 	def __init__(self):
 		pass
@@ -554,24 +1069,112 @@ class LibraryDetailsCache(object):
 	def formatPath(cls, path):
 		return path.lower()
 
+	# returns the LibraryDetails of the current version of the library (reading it if the version
+	# stored is outdated or it isn't stored)
+	@classmethod
+	def getLibrary(cls, path):
+		libDetails = cls.getCurrentLibrary(path)
+		if libDetails == None:
+			# if not added or outdated version read it
+			libDetails = cls.addLibrary(LibraryDetails(path))
+		return libDetails
+
+	# returns the stored LibraryDetails if it's of the current version of the library (otherwise None)
+	@classmethod
+	def getCurrentLibrary(cls, path):
+		libDetails = cls.libraries.get(cls.formatPath(path))
+		if (libDetails != None) and libDetails.isCurrent():
+			return libDetails
+		return None
+
+	# returns the details if the current version of the file has already been parsed otherwise returns
+	# None (used on the completion path where parsing is left to the background parser)
+	@classmethod
+	def getReadyDetails(cls, path):
+		if path == None:
+			return None
+		libDetails = cls.libraries.get(cls.formatPath(path))
+		if (libDetails != None) and (libDetails.contents != None) and libDetails.isCurrent():
+			return libDetails.getContents()
+		return None
+
+	# returns the details if the version of the library in the snapshot of its folder has already been
+	# parsed otherwise returns None. the file is never stat'ed (it's used on the completion path) so the
+	# libraries that haven't been parsed, have changed or could have changed without their time 
+	# changing are left for the background parser to check
+	@classmethod
+	def getSnapshotDetails(cls, path):
+		if path == None:
+			return None
+		libDetails = cls.libraries.get(cls.formatPath(path))
+		snapshot = cls.getExistingSnapshot(path)
+		libraryFile = None if (snapshot == None) else snapshot.getFile(path)
+		if (libDetails == None) or (libraryFile == None) or \
+			not libDetails.stamp.isSameVersion(libraryFile[2], libraryFile[3]):
+			cls.queueUpdateDetails(path)
+			return None
+		if libDetails.stamp.isRacy() or ((libDetails.contents == None) and (libDetails.parseError == None)):
+			cls.queueUpdateDetails(path)
+		if libDetails.contents == None:
+			return None
+		return libDetails.getContents()
+
+	# parses the file unless the current version has already been parsed
+	@classmethod
+	def updateDetails(cls, path):
+		if cls.getReadyDetails(path) == None:
+			cls.getLibrary(path).getContents()
+
+	@classmethod
+	def queueUpdateDetails(cls, path):
+		def updateDetails():
+			try:
+				cls.updateDetails(path)
+			except (OSError, ValueError):
+				# the library has been removed or has unclosed blocks
+				pass
+		BackgroundParser.getInstance().submit(('libraryDetails', cls.formatPath(path)), updateDetails, \
+			PRIORITY_BACKGROUND)
+
+	# the paths are only lower cased for the keys (the file is read with the path given)
+	@classmethod
+	def addLibrary(cls, libDetails):
+		cls.libraries[cls.formatPath(libDetails.path)] = libDetails
+		return libDetails
+
+	# returns the path of the library imported with the relative path (e.g. 'lib/A') by the file or None 
+	# if it's missing (or the library folder hasn't been scanned yet as it's never scanned here)
+	@classmethod
+	def resolveImportPath(cls, filePath, relativePath):
+		snapshot = cls.getExistingSnapshot(filePath)
+		if snapshot == None:
+			return None
+		return snapshot.resolve(relativePath)
+
+	# the LibrarySnapshot of the TestLibrary folder the file is in (None if it hasn't been scanned)
 	@classmethod
-	def getDetails(cls, path):
-		path = cls.formatPath(path)
-		# see if library is already stored
-		if (path in cls.libraries):
-			libDetails = cls.libraries[path]
-			# if the file has not been modified return it's details
-			if (libDetails.getLastModified() == os.path.getmtime(path)):
-				return libDetails.getContents()
+	def getExistingSnapshot(cls, filePath):
+		libraryDirPath = cls.getLibraryDirPath(filePath)
+		if libraryDirPath == None:
+			return None
+		return LibrarySnapshot.getExistingSnapshot(libraryDirPath)
 
-		# if not added or outdated version extract details then return them
-		cls.addLibrary(path)
-		return cls.libraries[path].getContents()
+	# the TestLibrary folder the file is in (None if it isn't in one)
+	@classmethod
+	def getLibraryDirPath(cls, filePath):
+		pos = filePath.lower().find(cls.LIBRARY_PARENT_FOLDER.lower())
+		if pos < 0:
+			return None
+		return filePath[:pos + len(cls.LIBRARY_PARENT_FOLDER)]
 
+	# the libraries of the paths are kept in the cache until the owner (e.g. a view's id) is unpinned
 	@classmethod
-	def addLibrary(cls, path):
-		path = cls.formatPath(path)
-		cls.libraries[path] = LibraryDetails(path)
+	def pin(cls, owner, paths):
+		cls.libraries.pin(owner, [cls.formatPath(path) for path in paths])
+
+	@classmethod
+	def unpin(cls, owner):
+		cls.libraries.unpin(owner)
 
 	@classmethod
 	def getLibraryPath(cls, relativePath):
@@ -593,125 +1196,339 @@ class LibraryDetailsCache(object):
 
 # returns formatted string for file with comments removed long with leading and trailing whitespaces
 def parseVBScriptLibrary(path):
-	outputContents = ''
+	return parseVBScriptText(readLibraryText(path))
+
+def parseVBScriptText(text):
+	lines = text.splitlines()
+	if not Stats.enabled:
+		return parseVBScriptTokens(lexVBScriptLines(lines), sourceLines=lines)
+
+	# the tokens are normally consumed as they are made, they're only all made first so that
+	# the lexing and parsing can be timed separately
+	with Stats.timer('lex'):
+		tokens = list(lexVBScriptLines(lines))
+	with Stats.timer('parse'):
+		return parseVBScriptTokens(tokens, sourceLines=lines)
+
+# builds the scopes from the tokens produced by lexVBScriptLines() consuming them as they arrive
+# (rootScope is the scope the tokens are parsed into when only part of a file is being parsed). when
+# the lines the tokens came from are given (sourceLines) the bodies of the methods are only parsed 
+# when they're first used, comment is the comment before the first token
+def parseVBScriptTokens(tokens, globalScope=None, rootScope=None, sourceLines=None, comment=None):
+	if globalScope == None:
+		globalScope = VBScriptScopeGlobal()
+	if rootScope == None:
+		rootScope = globalScope
 	# holds the scope for the current line (if empty then in global scope)
 	# array used becase of possibility of methods inside a class	
-	globalScope = VBScriptScopeGlobal()
-	currentScopeStack =[globalScope]
-	scopes = [globalScope]
-
-	lines = getVBScriptLines(path)
-	comment = None
+	currentScopeStack =[rootScope]
+	scopes = [rootScope]
 
-	for line, pos in lines:
-		if len(line) == 0:
+	tokens = iter(tokens)
+	for tokenType, line, pos in tokens:
+		if tokenType == VBSCRIPT_TOKEN_BLANK:
 			# clear comment
 			comment = None
 			continue
 
 		# builds comment
-		if line[0] == "'":
+		if tokenType == VBSCRIPT_TOKEN_COMMENT:
 			if comment == None:
 				comment = line[1:]
 			else:
 				comment += '\n' + line[1:]
+			continue
 
 		currentScope = currentScopeStack[-1]
 		newScope = currentScope.parseLine(line, comment, pos, globalScope)
 
-		# if end of current scope
-		if currentScope.hasEnded():
+		# if end of current scope (the root scope's end is never one of the tokens even when it has one)
+		if (len(currentScopeStack) > 1) and currentScope.hasEnded():
 			oldScope = currentScopeStack.pop(-1)
 			scopes.append(oldScope)
 			continue
 
 		if None != newScope:
+			if (sourceLines != None) and isinstance(newScope, VBScriptBlockMethod):
+				nestedScopes, comment = skipMethodBody(newScope, tokens, sourceLines, comment, globalScope)
+				scopes.extend(nestedScopes)
+				scopes.append(newScope)
+				continue
 			currentScopeStack.append(newScope)
 
 	# raises error if a non-global block has not been closed
 	if len(currentScopeStack) > 1:
-		raise ValueError('Unclosed VBScript blocks=%r' % map(lambda x:[x.__class__, x.name],currentScopeStack[1:]) )
+		raise ValueError('Unclosed VBScript blocks=%r' % [[x.__class__, x.name] for x in currentScopeStack[1:]])
 
 	return scopes
 
-def getVBScriptLines(path):
-	# list of the from [[line, pos], ...]
-	lines = []
-	# line indexes start a 1 to match sublime's line numbering
-	pos = 1
-	lastCodeLinePos = None
-	with openTryEncodings(path) as f:
-		for line in f:
-			codeLines, comment = seperateLineIntoCodeAndComment(line)
-			
-			if comment != None:
-				lines.append([comment, pos])
-
-			for code in codeLines:
-				if (lastCodeLinePos != None) and (len(lines[lastCodeLinePos]) > 0) and (lines[lastCodeLinePos][-1] == '_'):
-					# maybe need to add a space charater in betwine the two lines
-					lines[lastCodeLinePos] = lines[lastCodeLinePos][:-1] + code.strip(' \t')
-					continue
-
-				# if code line is split over multiple will line number of the last one
-				# this will help with the ranges for the scopes (used inside the VBScriptScope.parseLine() method)
-				lines.append([code, pos])
-				lastCodeLinePos = len(lines) - 1
-			pos += 1
-
-	return lines
-
-def seperateLineIntoCodeAndComment(line):
-	inStr = False
-	pos = 0
-	for char in line:
-		if char == '"':
-			inStr = not inStr
-		# exit loop when comment starts
-		elif (not inStr) and (char == "'"):
+# consumes the tokens of the method's body up to its end keeping the lines they came from for 
+# VBScriptBlockMethod.parseBody() (only the lines starting with 'End' or one of the keywords in 
+# VBSCRIPT_BLOCK_START_CLASSES are matched against the patterns). the bodies that can't be parsed separately from the 
+# rest of the file (ones with blocks nested in them or with statements on the same lines as the 
+# start or end of the method) are parsed straight away. returns the tuple (nestedScopes, comment) 
+# where comment is the comment after the end of the method
+def skipMethodBody(block, tokens, sourceLines, comment, globalScope):
+	bodyTokens = []
+	# the classes of the blocks nested in the method that haven't ended yet
+	nestedClasses = []
+	hasNestedBlocks = False
+	endLineNo = None
+	for token in tokens:
+		tokenType, line, pos = token
+		if tokenType == VBSCRIPT_TOKEN_CODE:
+			words = line.split(None, 1)
+			if words[0].lower() == 'end':
+				endingClass = nestedClasses[-1] if len(nestedClasses) > 0 else block.__class__
+				if endingClass.isEnd(line):
+					if len(nestedClasses) == 0:
+						endLineNo = pos
+						break
+					nestedClasses.pop(-1)
+			else:
+				scopeClass = getBlockStartClass(line, words)
+				if (scopeClass != None) and scopeClass.isStart(line):
+					nestedClasses.append(scopeClass)
+					hasNestedBlocks = True
+		bodyTokens.append(token)
+
+	if endLineNo == None:
+		raise ValueError('Unclosed VBScript blocks=%r' % [[block.__class__, block.name]])
+	block.scopeRange = range(block.startLineNumber + 1, endLineNo)
+
+	# comments on the end line only come before the end so aren't part of the body
+	lastBodyToken = len(bodyTokens) - 1
+	while (lastBodyToken >= 0) and (bodyTokens[lastBodyToken][2] == endLineNo):
+		if bodyTokens[lastBodyToken][0] != VBSCRIPT_TOKEN_COMMENT:
 			break
+		lastBodyToken -= 1
 
-		pos += 1
+	nestedScopes = []
+	if lastBodyToken >= 0:
+		if hasNestedBlocks or (bodyTokens[0][2] == block.startLineNumber) \
+			or (bodyTokens[lastBodyToken][2] == endLineNo):
+			nestedScopes = parseVBScriptTokens(bodyTokens, globalScope, block, comment=comment)[1:]
+		else:
+			block.setBody(sourceLines[block.startLineNumber:bodyTokens[lastBodyToken][2]], \
+				block.startLineNumber + 1, comment, globalScope)
 
-	codeLines = splitMultiLineCode(line[:pos])
-	if (len(line) == pos):
-		comment = None
-	else:
-		comment = line[pos:].strip()
-	return codeLines, comment
-
-def splitMultiLineCode(line):
-	lines = []
-	inStr = False
-	pos = 0
-	lastPos = 0
-	for char in line:
-		if char == '"':
-			inStr = not inStr
-		# exit loop when comment starts
-		elif (not inStr) and (char == ":"):
-			lines.append(line[lastPos:pos].strip())
-			lastPos = pos + 1
+	# the comment is carried on past the method as if the body had been parsed
+	for tokenType, line, pos in bodyTokens:
+		if tokenType == VBSCRIPT_TOKEN_BLANK:
+			comment = None
+		elif tokenType == VBSCRIPT_TOKEN_COMMENT:
+			if comment == None:
+				comment = line[1:]
+			else:
+				comment += '\n' + line[1:]
+	return nestedScopes, comment
 
-		pos += 1
+# keeps the scopes of a buffer that is being edited up to date re-parsing only the block that 
+# encloses the edited lines (and shifting the line numbers of everything after it) when possible
+class IncrementalVBScriptParser(object):
+	def __init__(self, text, path=None):
+		# the file the text is from (see VBScriptScopeGlobal.path)
+		self.path = path
+		# the lines of the last text that could be parsed (edits are found by comparing with these)
+		self.lines = []
+		# of the same form as returned by parseVBScriptLibrary() or None if no text could be parsed yet
+		self.scopes = None
+		# False while the latest text can't be parsed (the scopes are then of the last text that could)
+		self.isCurrent = False
+		self.update(text)
+
+	# returns the scopes of the last text that could be parsed (normally the text before a block 
+	# that's being typed was started)
+	def getScopes(self):
+		return self.scopes
+
+	def hasCurrentScopes(self):
+		return self.isCurrent
+
+	def update(self, text):
+		newLines = text.splitlines()
+		oldLines = self.lines
+
+		if self.scopes != None:
+			# number of unchanged lines at the start and end of the text
+			maxUnchanged = min(len(oldLines), len(newLines))
+			start = 0
+			while (start < maxUnchanged) and (oldLines[start] == newLines[start]):
+				start += 1
+			end = 0
+			while (end < maxUnchanged - start) and (oldLines[-1 - end] == newLines[-1 - end]):
+				end += 1
+
+			if (start == len(oldLines)) and (start == len(newLines)):
+				self.isCurrent = True
+				return
+			# line numbers start at 1
+			if self.reparseBlock(newLines, start + 1, len(oldLines) - end, len(newLines) - len(oldLines)):
+				self.lines = newLines
+				self.isCurrent = True
+				return
 
-	# incase of empty line
-	if len(line) > lastPos:
-		lines.append(line[lastPos:].strip())
-	return lines
+		try:
+			self.scopes = parseVBScriptTokens(lexVBScriptLines(newLines), sourceLines=newLines)
+		except ValueError:
+			# normally an unfinished block while it's being typed (the last scopes are kept)
+			self.isCurrent = False
+			return
+		self.scopes[0].path = self.path
+		self.lines = newLines
+		self.isCurrent = True
+
+	# re-parses the innermost block that contains all of the changed lines between firstLine and lastLine
+	# (of the old text) returns False if no block does and the whole text needs parsing
+	def reparseBlock(self, newLines, firstLine, lastLine, lineShift):
+		globalScope = self.scopes[0]
+		parent = globalScope
+		block = None
+		searchScope = globalScope
+		while searchScope != None:
+			found = None
+			for subBlock in searchScope.getSubBlocks():
+				# the start and end lines of the block have to be unchanged
+				if (subBlock.startLineNumber < firstLine) and (subBlock.getScopeRange().stop > lastLine):
+					found = subBlock
+					break
+			if found != None:
+				parent = searchScope
+				block = found
+			searchScope = found
+
+		if block == None:
+			return False
+
+		oldEndLine = block.getScopeRange().stop
+		newEndLine = oldEndLine + lineShift
+		rootScope = VBScriptScopeGlobal()
+		try:
+			parseVBScriptTokens(lexVBScriptLines(newLines[block.startLineNumber - 1:newEndLine], \
+				block.startLineNumber), globalScope, rootScope, newLines)
+		except ValueError:
+			return False
+
+		# the edit has to have left the block as a single block ending on the same line
+		newBlocks = list(rootScope.getSubBlocks())
+		if (len(newBlocks) != 1) or (len(rootScope.variables) != 0):
+			return False
+		newBlock = newBlocks[0]
+		if (newBlock.__class__ != block.__class__) or (newBlock.getScopeRange().stop != newEndLine):
+			return False
+
+		newBlock.comment = block.comment
+		parent.blocks[parent.formatKey(block.getName())] = newBlock
+		shiftScopeLines(globalScope, oldEndLine, lineShift, newBlock)
+		globalScope.resetScopeIndex()
+		self.scopes = [globalScope] + getNestedBlocks(globalScope)
+		return True
+
+# moves everything in the scope that comes after the line afterLine by lineShift lines
+# (skipping the block that was just re-parsed)
+def shiftScopeLines(scope, afterLine, lineShift, skipBlock):
+	if lineShift == 0:
+		return
+
+	# the variables of a method body are only made when it's parsed
+	if isinstance(scope, VBScriptBlockMethod) and not scope.isBodyParsed():
+		scope.shiftBody(afterLine, lineShift)
+		return
+
+	for var in scope.getVariables():
+		if var.lineNo > afterLine:
+			var.lineNo += lineShift
+
+	for block in scope.getSubBlocks():
+		if block is skipBlock:
+			continue
 
-def isVBScriptFile(path):
-	return (os.path.splitext(path)[1].lower() in ('.vbs', '.qfl'))
+		scopeRange = block.getScopeRange()
+		if block.startLineNumber > afterLine:
+			block.startLineNumber += lineShift
+			block.scopeRange = range(scopeRange.start + lineShift, scopeRange.stop + lineShift)
+		# the blocks that contain the re-parsed block
+		elif scopeRange.stop >= afterLine:
+			block.scopeRange = range(scopeRange.start, scopeRange.stop + lineShift)
+		else:
+			continue
+		shiftScopeLines(block, afterLine, lineShift, skipBlock)
+
+# returns all the blocks nested in the scope in the order that they end (same order as parseVBScriptLibrary())
+def getNestedBlocks(scope):
+	blocks = []
+	for block in scope.getSubBlocks():
+		blocks.extend(getNestedBlocks(block))
+		blocks.append(block)
+	return blocks
+
+# returns the line ranges of the blocks returned by parseVBScriptLibrary() as a list of the form
+# [[blockClassName, name, startLine, endLine], ...] (used by the persistent library index)
+def getScopeRanges(scopes):
+	ranges = []
+	for scope in scopes:
+		scopeRange = scope.getScopeRange()
+		if scopeRange == None:
+			continue
+		ranges.append([scope.__class__.__name__, scope.getName(), scope.startLineNumber, scopeRange.stop])
+	return ranges
 
-def openTryEncodings(path, encType='r'):
-	# can be found at 'https://docs.python.org/2.4/lib/standard-encodings.html'
-	# doesn't have correct encoding for .qfl files (must be saved again as UTF-8)
-	encodings = ['utf-8', 'utf-16', 'ascii']
-	for e in encodings:
-		try:
-			codecs.open(path, encType, e).read()
-			return codecs.open(path, encType, e)
-		except UnicodeDecodeError as e:
+# list of the from [[line, pos], ...] (comments are included as lines starting with the "'" character)
+def getVBScriptLines(path):
+	return [[line, pos] for tokenType, line, pos in iterVBScriptLines(path) if tokenType != VBSCRIPT_TOKEN_BLANK]
+
+# generator of the (tokenType, line, pos) tuples for a library file (see lexVBScriptLines())
+def iterVBScriptLines(path):
+	return lexVBScriptLines(readLibraryText(path).splitlines())
+
+# single pass over the physical lines yielding a (tokenType, line, pos) tuple for each comment, ':' 
+# separated statement and blank line. lines ending with the '_' continuation character are joined 
+# with the following ones and given the line number of the last one (this will help with the ranges 
+# for the scopes used inside the VBScriptScope.parseLine() method)
+def lexVBScriptLines(lines, firstLineNo=1):
+	# code from previous lines that were continued with the '_' character
+	continued = None
+	# line indexes start a 1 to match sublime's line numbering
+	pos = firstLineNo - 1
+	for pos, line in enumerate(lines, firstLineNo):
+		statements = []
+		parts = []
+		comment = None
+		# string literals are matched whole so any "'" and ':' characters inside them are ignored
+		for part in VBSCRIPT_LINE_PARTS_REGEX.findall(line):
+			if part[0] == "'":
+				comment = part.strip()
+				break
+			elif part == ':':
+				statements.append(''.join(parts).strip())
+				parts = []
+			else:
+				parts.append(part)
+		statements.append(''.join(parts).strip())
+
+		if comment != None:
+			yield (VBSCRIPT_TOKEN_COMMENT, comment, pos)
+		elif (continued == None) and (len(statements) == 1) and (len(statements[0]) == 0):
+			yield (VBSCRIPT_TOKEN_BLANK, '', pos)
 			continue
 
-	raise FileEncodingNotFoundException('no encoding found for the file %s' % path)
\ No newline at end of file
+		for code in statements:
+			if continued != None:
+				code = continued + code
+				continued = None
+
+			if len(code) == 0:
+				continue
+
+			if VBSCRIPT_LINE_CONTINUATION_REGEX.search(code):
+				continued = code[:-1].rstrip() + ' '
+				continue
+
+			yield (VBSCRIPT_TOKEN_CODE, code, pos)
+
+	# a continuation character on the last line of the file
+	if continued != None and len(continued.strip()) > 0:
+		yield (VBSCRIPT_TOKEN_CODE, continued.strip(), pos)
+
+def isVBScriptFile(path):
+	return (os.path.splitext(path)[1].lower() in ('.vbs', '.qfl'))
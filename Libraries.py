@@ -2,393 +2,790 @@
 
 import sublime_plugin
 import sublime
-import re
 import os
-import codecs
-import time
+import threading
+import json
+
+# sublime loads the plugin as '<Package>.<module>' without the package folder on sys.path while the
+# benchmarks and the command line tool import the modules directly
+if __package__:
+	from . import ImportDetails
+	from .VBScriptLibraryUtil.index import LibraryIndex, indexLibrary
+	from .VBScriptLibraryUtil.declarations import scanDeclarations, returnClassString
+	from .VBScriptLibraryUtil.dependencies import LibraryDependencyGraph, extractImports, findImports
+	from .VBScriptLibraryUtil.lrucache import LRUCache
+	from .VBScriptLibraryUtil.completions import CompletionIndex
+	from .VBScriptLibraryUtil.filestamp import FileStamp
+	from .VBScriptLibraryUtil.snapshot import LibrarySnapshot
+	from .VBScriptLibraryUtil.stats import Stats
+	from .VBScriptLibraryUtil.symbols import SymbolIndex, formatSymbol
+	from .VBScriptLibraryUtil.workers import BackgroundParser, PRIORITY_VISIBLE, PRIORITY_BACKGROUND
+else:
+	import ImportDetails
+	from VBScriptLibraryUtil.index import LibraryIndex, indexLibrary
+	from VBScriptLibraryUtil.declarations import scanDeclarations, returnClassString
+	from VBScriptLibraryUtil.dependencies import LibraryDependencyGraph, extractImports, findImports
+	from VBScriptLibraryUtil.lrucache import LRUCache
+	from VBScriptLibraryUtil.completions import CompletionIndex
+	from VBScriptLibraryUtil.filestamp import FileStamp
+	from VBScriptLibraryUtil.snapshot import LibrarySnapshot
+	from VBScriptLibraryUtil.stats import Stats
+	from VBScriptLibraryUtil.symbols import SymbolIndex, formatSymbol
+	from VBScriptLibraryUtil.workers import BackgroundParser, PRIORITY_VISIBLE, PRIORITY_BACKGROUND
 
-VBSCRIPT_ALLOW_VAR_NAME_REGEX = '\\b[a-zA-Z]{1}[a-zA-Z0-9_]{,254}\\b'
 VBSCRIPT_LIBRARY_PARENT_FOLDER = '\\testlibrary\\'
-
-class FileNotFoundError:
+SETTINGS_FILE_NAME = 'VBScriptLibraries.sublime-settings'
+# key of the hidden regions that follow the import statements in a view as it's edited
+IMPORT_REGIONS_KEY = 'vbscript_library_imports'
+# the edited ranges are only given to plugins by text change listeners (sublime text 4) otherwise 
+# they're found by comparing the text with the text from before the edit
+TEXT_CHANGE_LISTENER_AVAILABLE = hasattr(sublime_plugin, 'TextChangeListener')
+# sublime only asks for the completions again as more is typed if they are returned with this flag 
+# (sublime text 4) otherwise all of them have to be returned for sublime to filter
+DYNAMIC_COMPLETIONS_AVAILABLE = hasattr(sublime, 'DYNAMIC_COMPLETIONS')
+
+class FileNotFoundError(Exception):
 	pass
 
 class ImportedClassesMethods(sublime_plugin.EventListener):
+	# should be of the form {path : [FileStampInstance, [[trigger1, contents1], ... ]], ... }
+	# (the limits are set from the settings by plugin_loaded())
+	libraryMethodDetails = LRUCache(sizeOf=lambda details: estimateLibraryMethodsSize(details[1]), \
+		onEvict=lambda path, details: LibraryDependencyGraph.dropMemberTables(path))
+	# should be of the form {viewId : [change_count, imports, {variableNames : [[[path, 
+	# file_last_updated_time], ... ], CompletionIndexInstance, storedLibraryPath, FileStampInstance], 
+	# ... }], ... }
+	viewCompletions = {}
+	# the most completions returned for each query (set from the settings by plugin_loaded())
+	maxCompletionResults = 100
+
 	def __init__(self):
-		# should be of the form {path : [file_last_updated_time, [[trigger1, contents1], ... ]], ... }
-		self.libraryMethodDetails = {}
+		pass
 
 	def on_query_completions(self, view, prefix, locations):
+		with Stats.timer('completion'):
+			return self.queryCompletions(view, prefix, locations)
+
+	def queryCompletions(self, view, prefix, locations):
 		words = []
 		matches = []
 
 		filePath = view.file_name()
 		# exits if not in a vbscript file
-		if not (isVbScriptFile(filePath)):
+		if (filePath == None) or not (isVbScriptFile(filePath)):
 			return []
 
-		# to get the preceeding word (which could be a varaible storing a library)
-		variableName, charFollowing = getViewWordBeforeCursorsWord(view)
-		# gets a dictionary of all the imports used in the currently opened file 
-		# looks at the saved version no sublime's opened one
-		currentViewContentStr = getViewText(view)
-		imports = extractImports(currentViewContentStr)
+		# to get the preceeding words (the first of which could be a varaible storing a library and the 
+		# rest variables storing the libraries it imports e.g. 'a.b.')
+		variableNames = getVariableTreeBeforeCursor(view)
+		if len(variableNames) == 0:
+			return []
 
 		# gets the path of the current \TestLibrary\ directory
-		libraryDirPath = filePath[:filePath.lower().find(VBSCRIPT_LIBRARY_PARENT_FOLDER) \
-			+ len(VBSCRIPT_LIBRARY_PARENT_FOLDER)]
+		libraryDirPath = getLibraryDirPath(filePath)
+		if libraryDirPath == None:
+			return []
+
+		# the library files are only looked up in the snapshot of the folder (so nothing on the 
+		# completion path touches the disk), the standard suggestions are used until it's been taken
+		snapshot = LibrarySnapshot.getExistingSnapshot(libraryDirPath)
+		if snapshot == None:
+			BackgroundParser.getInstance().submit(('snapshot', libraryDirPath), \
+				lambda: self.queueViewLibraries(view, PRIORITY_VISIBLE), PRIORITY_VISIBLE)
+			return []
+		if snapshot.isStale():
+			self.queueSnapshot(libraryDirPath, PRIORITY_BACKGROUND)
+
+		# a repeat query for the same variables at the same buffer state (e.g. after a cursor 
+		# move) is answered from the memo as long as the libraries haven't changed
+		viewMemo = self.getViewMemo(view)
+		memoKey = tuple(variableNames)
+		completions = viewMemo[2].get(memoKey)
+		if (completions != None) and areLibraryStampsCurrent(snapshot, completions[0]) \
+			and self.isLibraryStampStored(libraryDirPath, completions[2], completions[3]):
+			Stats.recordLookup('viewMemo', True)
+			with Stats.timer('completion build'):
+				return self.getCompletionResults(completions[1], prefix)
+		Stats.recordLookup('viewMemo', False)
+
+		# gets a dictionary of all the imports used in the currently opened file (memoized until 
+		# the buffer changes)
+		imports = viewMemo[1]
 
 		# if a '.' character follows the keyword try to display the methods
 		# also ignores words that do not contain library classes
-		if charFollowing == '.' and (variableName in imports.keys()):
+		if variableNames[0] in imports.keys():
 			try:
-				storedLibraryPath = self.getFullLibraryPath(libraryDirPath, imports[variableName])
-				#storedLibraryPath = os.path.join(libraryDirPath, imports[variableName])
-				# checks if the library methods for the current file version have been already stored
-				if self.checkIfLibraryMethodsInfoIsStored(storedLibraryPath):
-					pass
-				# if the file exists the store the methods
-				else:
-					self.storeLibraryMethods(storedLibraryPath)
+				storedLibraryPath = self.getFullLibraryPath(libraryDirPath, imports[variableNames[0]])
 			except FileNotFoundError:
 				return []
+			rootLibraryPath = storedLibraryPath
+
+			# follows the chain of imports through the libraries
+			if len(variableNames) > 1:
+				importedLibraryPath = self.getDependencyGraph(libraryDirPath).resolveChain(storedLibraryPath, \
+					variableNames[1:])
+				if importedLibraryPath == None:
+					self.queueLibrary(libraryDirPath, storedLibraryPath, PRIORITY_VISIBLE)
+					return []
+				storedLibraryPath = importedLibraryPath
+
+			with Stats.timer('cache lookup'):
+				# checks if the library methods for the current file version have been already stored
+				isStored = self.checkIfLibraryMethodsInfoIsStored(libraryDirPath, storedLibraryPath)
+				Stats.recordLookup('libraryMethods', isStored)
+				# if the persistent index has the current file version then no parsing is needed
+				if not isStored:
+					isStored = self.loadLibraryMethodsFromIndex(libraryDirPath, storedLibraryPath)
+					Stats.recordLookup('index', isStored)
+			# libraries are never parsed here, the standard suggestions are used until it's ready
+			if not isStored:
+				self.queueLibrary(libraryDirPath, storedLibraryPath, PRIORITY_VISIBLE)
+				return []
 
-			matches = self.getStoredLibraryMethodsDetails(storedLibraryPath)
+			with Stats.timer('completion build'):
+				memberTable = self.getLibraryMemberTable(libraryDirPath, storedLibraryPath)
+				viewMemo[2][memoKey] = [getLibraryStamps(snapshot, set([rootLibraryPath, \
+					storedLibraryPath])), memberTable, storedLibraryPath, \
+					self.getStoredLibraryStamp(storedLibraryPath)]
+				matches = self.getCompletionResults(memberTable, prefix)
 
 		# if an empty list is returned from this method then the standard sublime suggestions will be used
 		# this means that after any keyword that stores a library none of the standard suggestions will be 
 		# available but everywhere else it'll just display the standard auto-complete options
 		return matches
 
-	def getFullLibraryPath(self, libraryDirPath, relativeFilePath):
-		basePath = os.path.join(libraryDirPath, relativeFilePath)
-		for extension in ['.vbs', '.qfl']:
-			tempPath = basePath + extension
-			if os.path.isfile(tempPath):
-				return tempPath
+	# the libraries imported by a view are parsed in the background as soon as it's opened, 
+	# switched to or saved so that they are normally ready before the first completion
+	def on_load_async(self, view):
+		self.queueViewLibraries(view, PRIORITY_BACKGROUND)
+
+	def on_activated_async(self, view):
+		self.queueViewLibraries(view, PRIORITY_VISIBLE)
+
+	def on_post_save_async(self, view):
+		filePath = view.file_name()
+		libraryDirPath = None if (filePath == None) else getLibraryDirPath(filePath)
+		if (libraryDirPath != None) and isVbScriptFile(filePath):
+			LibrarySnapshot.getSnapshot(libraryDirPath).updateFile(filePath)
+		self.queueViewLibraries(view, PRIORITY_VISIBLE)
+
+	# the libraries are no longer kept for the view once it's closed
+	def on_close(self, view):
+		self.libraryMethodDetails.unpin(view.id())
+		ImportDetails.LibraryDetailsCache.unpin(view.id())
+		self.viewCompletions.pop(view.id(), None)
+		ViewImportTable.dropTable(view)
+
+	# without a text change listener the edited range is found from the text after each edit
+	def on_modified(self, view):
+		if not TEXT_CHANGE_LISTENER_AVAILABLE:
+			table = ViewImportTable.getExistingTable(view)
+			if table != None:
+				table.updateFromText()
+
+	# returns the memo for the view's current buffer (the memoized completions are dropped once 
+	# the buffer has changed)
+	def getViewMemo(self, view):
+		changeCount = view.change_count()
+		viewMemo = self.viewCompletions.get(view.id())
+		if (viewMemo == None) or (viewMemo[0] != changeCount):
+			viewMemo = [changeCount, ViewImportTable.getTable(view).getImports(), {}]
+			self.viewCompletions[view.id()] = viewMemo
+		return viewMemo
+
+	def queueViewLibraries(self, view, priority):
+		filePath = view.file_name()
+		if (filePath == None) or not (isVbScriptFile(filePath)):
+			return
+
+		libraryDirPath = getLibraryDirPath(filePath)
+		if libraryDirPath == None:
+			return
+
+		# a saved library is re-indexed straight away (once it's on disk)
+		if os.path.normcase(filePath).startswith(os.path.normcase(libraryDirPath)):
+			self.queueLibrary(libraryDirPath, filePath, priority)
+
+		imports = self.getViewMemo(view)[1]
+		paths = []
+		for relativeFilePath in set(imports.values()):
+			try:
+				path = self.getFullLibraryPath(libraryDirPath, relativeFilePath)
+			except FileNotFoundError:
+				continue
+			paths.append(path)
+			self.queueLibrary(libraryDirPath, path, priority)
+
+		# the libraries imported by open views are never evicted from the caches
+		self.libraryMethodDetails.pin(view.id(), paths)
+		ImportDetails.LibraryDetailsCache.pin(view.id(), paths)
+
+	def queueSnapshot(self, libraryDirPath, priority):
+		BackgroundParser.getInstance().submit(('snapshot', libraryDirPath), \
+			lambda: LibrarySnapshot.getSnapshot(libraryDirPath).rescan(), priority)
+
+	def queueLibrary(self, libraryDirPath, path, priority):
+		BackgroundParser.getInstance().submit(('methods', path), \
+			lambda: self.updateLibraryMethods(libraryDirPath, path), priority)
+
+	# run on the background parser threads
+	def updateLibraryMethods(self, libraryDirPath, path):
+		# the snapshot of the library is brought up to date first so that the stored details match it
+		snapshot = LibrarySnapshot.getSnapshot(libraryDirPath)
+		snapshot.updateFile(path)
+		# the view's file may not have been saved yet (or was deleted or is a '.qfl' hidden by a '.vbs')
+		if snapshot.getFile(path) == None:
+			return
+		# the library read for its imports is the same version used for its methods
+		library = self.updateLibraryImports(libraryDirPath, path)
+
+		if self.checkIfLibraryMethodsInfoIsStored(libraryDirPath, path, True):
+			return
+		if self.loadLibraryMethodsFromIndex(libraryDirPath, path, True):
+			return
+		self.storeLibraryMethods(path, libraryDirPath, library)
+
+	# reads the libraries imported by the library (if it has changed) and queues the ones that 
+	# haven't been read yet so that the chains of imports can be resolved, returns the LibraryDetails 
+	# read (or None if the imports were already current or taken from the index). the details are only 
+	# cached once they're stored (a library whose methods are loaded from the index doesn't need them kept)
+	def updateLibraryImports(self, libraryDirPath, path):
+		graph = self.getDependencyGraph(libraryDirPath)
+		libraryFile = LibrarySnapshot.getSnapshot(libraryDirPath).getFile(path)
+		if libraryFile == None:
+			return None
+		path, extension, lastModified, size = libraryFile
+		if graph.isNodeCurrent(path, lastModified):
+			return None
+
+		# a warm start only reads the libraries that have changed since they were indexed
+		entry = LibraryIndex.getIndex(libraryDirPath).getEntry(path, lastModified, size)
+		if entry != None:
+			for importPath in graph.updateNode(path, entry['imports'], lastModified):
+				self.queueLibrary(libraryDirPath, importPath, PRIORITY_BACKGROUND)
+			return None
 
-		raise FileNotFoundError
+		library = ImportDetails.LibraryDetailsCache.getCurrentLibrary(path)
+		if library == None:
+			library = ImportDetails.LibraryDetails(path)
+		for importPath in graph.updateNode(path, library.getImports(), lastModified):
+			self.queueLibrary(libraryDirPath, importPath, PRIORITY_BACKGROUND)
+		return library
 
-	def checkIfLibraryMethodsInfoIsStored(self, path):
-		if not (path in self.libraryMethodDetails.keys()):
+	def getDependencyGraph(self, libraryDirPath):
+		def resolveImportPath(relativePath):
+			try:
+				return self.getFullLibraryPath(libraryDirPath, relativePath)
+			except FileNotFoundError:
+				return None
+		return LibraryDependencyGraph.getGraph(libraryDirPath, resolveImportPath)
+
+	# returns the CompletionIndex for the library which has its stored methods and properties along 
+	# with the variables for the libraries it imports (memoized until the library changes)
+	def getLibraryMemberTable(self, libraryDirPath, path):
+		matches = self.getStoredLibraryMethodsDetails(path)
+		def buildMemberTable(node):
+			if node == None:
+				return CompletionIndex(matches)
+			return CompletionIndex(matches + buildImportMatches(node.imports))
+		return self.getDependencyGraph(libraryDirPath).getMemberTable(path, buildMemberTable)
+
+	# only the best matches for what has been typed are returned when sublime will ask again as 
+	# more is typed
+	def getCompletionResults(self, memberTable, prefix):
+		if not DYNAMIC_COMPLETIONS_AVAILABLE:
+			return memberTable.matches
+		return (memberTable.search(prefix, self.maxCompletionResults), sublime.DYNAMIC_COMPLETIONS)
+
+	# the '.vbs' library is used if there is also a '.qfl' one
+	def getFullLibraryPath(self, libraryDirPath, relativeFilePath):
+		path = LibrarySnapshot.getSnapshot(libraryDirPath).resolve(relativeFilePath)
+		if path == None:
+			raise FileNotFoundError
+		return path
+
+	# the stored details are checked against the FileStamp of the version that was parsed. the file 
+	# is only read when readFile is True (on the background parser) otherwise the details are only 
+	# used if the time and size match
+	def checkIfLibraryMethodsInfoIsStored(self, libraryDirPath, path, readFile=False):
+		# read once as the library could be evicted by a background parser thread at any time
+		details = self.libraryMethodDetails.get(path)
+		if details == None:
 			return False
 		else:
-			if (os.path.isfile(path)):
+			libraryFile = LibrarySnapshot.getSnapshot(libraryDirPath).getFile(path)
+			if libraryFile != None:
 				# checks if the newest vesion of the library has be stored
-				return os.path.getmtime(path) == self.libraryMethodDetails[path][0]
+				stamp = details[0]
+				if readFile:
+					return stamp.matches(path, libraryFile[2], libraryFile[3])
+				# a library saved just before it was parsed could have changed again without its time
+				# changing so its contents are checked in the background
+				if stamp.isRacy():
+					self.queueLibrary(libraryDirPath, path, PRIORITY_BACKGROUND)
+				return stamp.isSameVersion(libraryFile[2], libraryFile[3])
 			else:
 				# removes key from the dictionary (as not the most uptodate version) 
 				self.libraryMethodDetails.pop(path, None)
 				return False
 
-	def storeLibraryMethods(self, path):
-		matches = []
-		importClassContentStr = returnClassString(path)
-		properties = extractProperties(importClassContentStr)
-		for prop in properties:
-			comment, scope, propertyName = prop
-			# ignores the private properties
-			if scope == 'private':
-				continue
-
-			trigger, contents = buildTriggerAndContents(comment, propertyName)
-			matches.append(('$%s' % trigger, contents))
-
-		# extract all the methods of the library and put them into the matches array 
-		# elements of the matches array are tuples with a tiggers and the actualy contents
-		methods = extractMethods(importClassContentStr)
-		for method in methods:
-			comment, scope, methodParamsStr = method
-			# ignores the private methods
-			if scope == 'private':
-				continue
+	def loadLibraryMethodsFromIndex(self, libraryDirPath, path, readFile=False):
+		libraryFile = LibrarySnapshot.getSnapshot(libraryDirPath).getFile(path)
+		if libraryFile == None:
+			return False
+		path, extension, lastModified, size = libraryFile
+		entry = LibraryIndex.getIndex(libraryDirPath).getEntry(path, lastModified, size, readFile)
+		if entry == None:
+			return False
 
-			trigger, contents = buildTriggerAndContents(comment, methodParamsStr)
-			matches.append((trigger, contents))
+		matches = buildLibraryMatches(entry['properties'], entry['methods'])
+		self.libraryMethodDetails[path] = [FileStamp.fromEntry(entry), matches]
+		self.getDependencyGraph(libraryDirPath).invalidate(path)
+		return True
+
+	# the methods are taken from the LibraryDetails shared with the expression resolver (which are
+	# read unless they're given or the current version is already cached)
+	def storeLibraryMethods(self, path, libraryDirPath=None, library=None):
+		if library == None:
+			library = ImportDetails.LibraryDetailsCache.getLibrary(path)
+		elif ImportDetails.LibraryDetailsCache.getCurrentLibrary(path) != library:
+			ImportDetails.LibraryDetailsCache.addLibrary(library)
+		methods, properties = library.getPublicDeclarations()
+		matches = buildLibraryMatches(properties, methods)
+
+		# stores the library methods in the global variable (the stamp is of the text that was parsed
+		# so a change while it's parsed is found)
+		self.libraryMethodDetails[path] = [library.stamp, matches]
+		if libraryDirPath != None:
+			self.getDependencyGraph(libraryDirPath).invalidate(path)
+
+		if libraryDirPath != None:
+			self.storeLibraryMethodsInIndex(libraryDirPath, path, library)
+
+	def storeLibraryMethodsInIndex(self, libraryDirPath, path, library):
+		methods, properties = library.getPublicDeclarations()
+
+		index = LibraryIndex.getIndex(libraryDirPath)
+		index.setEntry(path, methods, properties, library.getScopeRanges(), library.getImports(), library.stamp, \
+			library.getParseError())
+		self.queueIndexSave(libraryDirPath)
+
+	# the index is written once after the libraries queued before the save have been stored (rather 
+	# than rewriting the whole file after each library)
+	def queueIndexSave(self, libraryDirPath):
+		BackgroundParser.getInstance().submit(('saveIndex', libraryDirPath), \
+			lambda: LibraryIndex.getIndex(libraryDirPath).save(), PRIORITY_BACKGROUND)
+
+	# the FileStamp of the stored details of the library (or None if they aren't stored)
+	def getStoredLibraryStamp(self, path):
+		details = self.libraryMethodDetails.get(path)
+		if details == None:
+			return None
+		return details[0]
 
-		# stores the library methods in the global variable 
-		self.libraryMethodDetails[path] = [os.path.getmtime(path), matches]
+	# true if the details stored with the stamp are still stored and are for the current version of
+	# the library (a library rewritten without its time changing is stored again with a new stamp)
+	def isLibraryStampStored(self, libraryDirPath, path, stamp):
+		if not self.checkIfLibraryMethodsInfoIsStored(libraryDirPath, path):
+			return False
+		return (stamp != None) and (self.getStoredLibraryStamp(path) is stamp)
 
 	def getStoredLibraryMethodsDetails(self, path):
-		return self.libraryMethodDetails[path][1]
-
-	
-
+		# could have been evicted since it was checked
+		details = self.libraryMethodDetails.get(path)
+		if details == None:
+			return []
+		return details[1]
+
+# rescans the library folders straight away (they are otherwise rescanned in the background 
+# every SNAPSHOT_MAX_AGE seconds) e.g. after libraries have been added outside of sublime
+class RescanVbscriptLibrariesCommand(sublime_plugin.WindowCommand):
+	def run(self):
+		for snapshot in list(LibrarySnapshot.snapshots.values()):
+			ImportedClassesMethods().queueSnapshot(snapshot.libraryDirPath, PRIORITY_VISIBLE)
+
+# opens the timings of the parsing and completion stages and the cache hit ratios (collected while
+# the 'collect_timing_stats' setting is on) and the import cycles found as JSON in a new tab
+class DumpVbscriptLibraryStatsCommand(sublime_plugin.WindowCommand):
+	def run(self, reset=False):
+		view = self.window.new_file()
+		view.set_name('VBScript Libraries Stats')
+		view.set_scratch(True)
+		view.assign_syntax('Packages/JavaScript/JSON.sublime-syntax')
+		report = Stats.getReport()
+		report['importCycles'] = LibraryDependencyGraph.getCycles()
+		view.run_command('append', {'characters':json.dumps(report, indent=2, sort_keys=True)})
+		if reset:
+			Stats.reset()
+
+# searches the public methods and properties of every library in the TestLibrary folder (of the
+# active view or of the window's folders) by the words of their names and descriptions and opens the
+# one picked. the libraries that aren't in the persistent index are parsed first in the background
+class FindVbscriptLibraryMethodCommand(sublime_plugin.WindowCommand):
+	# the most results shown (set from the settings by plugin_loaded())
+	maxResults = 500
+	lastQuery = ''
+	# of the form {libraryDirPath:Lock, ... } so that the index of each folder is only brought up to 
+	# date by one background parser thread at a time
+	updateLocks = {}
+	# of the form {libraryDirPath:query, ... } for the newest query of each folder that hasn't been 
+	# searched yet (an earlier query still waiting is replaced)
+	pendingQueries = {}
+	pendingLock = threading.Lock()
+
+	def run(self):
+		libraryDirPath = self.getLibraryDirPath()
+		if libraryDirPath == None:
+			sublime.status_message('No \\TestLibrary\\ folder found to search')
+			return
+		BackgroundParser.getInstance().submit(('symbols', libraryDirPath), \
+			lambda: self.updateSymbolIndex(libraryDirPath), PRIORITY_VISIBLE)
+		self.window.show_input_panel('Find library method:', self.lastQuery, \
+			lambda query: self.search(libraryDirPath, query), None, None)
+
+	def getLibraryDirPath(self):
+		view = self.window.active_view()
+		if (view != None) and (view.file_name() != None):
+			libraryDirPath = getLibraryDirPath(view.file_name())
+			if libraryDirPath != None:
+				return libraryDirPath
+		for folder in self.window.folders():
+			libraryDirPath = getLibraryDirPath(os.path.join(folder, ''))
+			if libraryDirPath != None:
+				return libraryDirPath
+		return None
 
-# gets the word preceeding the word that the cursor is curently at
-# returns the tuple (preceedingWord, charFollowing)
-def getViewWordBeforeCursorsWord(view):
+	# run on the background parser threads, indexes the libraries that haven't been indexed (or have 
+	# changed since) and then brings the symbols up to date with the index. if another thread is 
+	# already updating it this returns straight away (rather than holding up a second thread) and 
+	# the other thread searches the query once it has finished
+	def updateSymbolIndex(self, libraryDirPath):
+		updateLock = self.getUpdateLock(libraryDirPath)
+		if not updateLock.acquire(False):
+			return
+		try:
+			self.indexLibraries(libraryDirPath)
+		finally:
+			updateLock.release()
+		self.searchPendingQuery(libraryDirPath)
+
+	@classmethod
+	def getUpdateLock(cls, libraryDirPath):
+		with cls.pendingLock:
+			return cls.updateLocks.setdefault(os.path.normcase(libraryDirPath), threading.Lock())
+
+	def indexLibraries(self, libraryDirPath):
+		snapshot = LibrarySnapshot.getSnapshot(libraryDirPath)
+		if snapshot.isStale():
+			snapshot.rescan()
+
+		index = LibraryIndex.getIndex(libraryDirPath)
+		libraryFiles = list(snapshot.files.values())
+		paths = []
+		for count, libraryFile in enumerate(libraryFiles, 1):
+			path, extension, lastModified, size = libraryFile
+			paths.append(path)
+			if index.getEntry(path, lastModified, size) != None:
+				continue
+			path, entry, error, seconds = indexLibrary(path)
+			if entry == None:
+				index.removeEntry(path)
+			else:
+				methods, properties, scopes, imports, stamp = entry
+				index.setEntry(path, methods, properties, scopes, imports, stamp, error)
+			if count % 100 == 0:
+				sublime.status_message('Indexing libraries %d/%d' % (count, len(libraryFiles)))
+		index.save()
+		SymbolIndex.getIndex(libraryDirPath).update(index, paths)
+
+	# the symbols are searched once the index is up to date (which only has to check the libraries
+	# if the indexing started by run() has finished)
+	def search(self, libraryDirPath, query):
+		FindVbscriptLibraryMethodCommand.lastQuery = query
+		with self.pendingLock:
+			self.pendingQueries[libraryDirPath] = query
+		BackgroundParser.getInstance().submit(('symbolSearch', libraryDirPath), \
+			lambda: self.updateSymbolIndex(libraryDirPath), PRIORITY_VISIBLE)
+
+	# searches the newest query of the folder (if it hasn't already been searched by another thread)
+	def searchPendingQuery(self, libraryDirPath):
+		with self.pendingLock:
+			query = self.pendingQueries.pop(libraryDirPath, None)
+		if query == None:
+			return
+		results = SymbolIndex.getIndex(libraryDirPath).search(query, self.maxResults)
+		sublime.set_timeout(lambda: self.showResults(libraryDirPath, query, results), 0)
+
+	def showResults(self, libraryDirPath, query, results):
+		if len(results) == 0:
+			sublime.status_message('No library methods found for "%s"' % query)
+			return
+		items = [[formatSymbol(symbol), symbol.description or '', os.path.relpath(symbol.path, libraryDirPath)] \
+			for symbol in results]
+		def openSymbol(pos):
+			if pos == -1:
+				return
+			symbol = results[pos]
+			self.window.open_file('%s:%d' % (symbol.path, max(symbol.lineNumber, 1)), sublime.ENCODED_POSITION)
+		self.window.show_quick_panel(items, openSymbol)
+
+# the import statements of a buffer which are found once when the view is loaded and then only 
+# the edited lines are re-matched (the statements are followed with hidden regions which sublime 
+# moves as the text around them changes)
+class ViewImportTable(object):
+	# should be of the form {bufferId : ViewImportTableInstance, ... }
+	tables = {}
+	tablesLock = threading.RLock()
+
+	# returns the table for the view's buffer (building it if needed) which is brought up to date 
+	# if any of the edits were missed
+	@classmethod
+	def getTable(cls, view):
+		with cls.tablesLock:
+			table = cls.tables.get(view.buffer_id())
+			if table == None:
+				table = ViewImportTable(view)
+				cls.tables[view.buffer_id()] = table
+			elif table.changeCount != table.view.change_count():
+				table.rebuild()
+			return table
+
+	@classmethod
+	def getExistingTable(cls, view):
+		return cls.tables.get(view.buffer_id())
+
+	# the table is rebuilt from another view of the buffer the next time it's needed
+	@classmethod
+	def dropTable(cls, view):
+		with cls.tablesLock:
+			table = cls.tables.get(view.buffer_id())
+			if (table != None) and (table.view.id() == view.id()):
+				del cls.tables[view.buffer_id()]
+
+	def __init__(self, view):
+		self.view = view
+		# of the form [[variableName, relativePath], ... ] in the same order as the regions
+		self.entries = []
+		# the dictionary of the imports (None until it's needed after a change)
+		self.imports = None
+		self.changeCount = None
+		# the text the regions are for (only kept when there's no text change listener)
+		self.text = None
+		self.rebuild()
+
+	def rebuild(self):
+		regions = []
+		self.entries = []
+		text = getViewText(self.view)
+		for start, end, variableName, relativePath in findImports(text):
+			regions.append(sublime.Region(start, end))
+			self.entries.append([variableName, relativePath])
+		self.setRegions(regions, text)
+
+	def setRegions(self, regions, text=None):
+		self.view.add_regions(IMPORT_REGIONS_KEY, regions, '', '', sublime.HIDDEN)
+		self.imports = None
+		self.changeCount = self.view.change_count()
+		if not TEXT_CHANGE_LISTENER_AVAILABLE:
+			self.text = text if text != None else getViewText(self.view)
+
+	# returns a dictionary of the variables and their relative paths (later imports of the same 
+	# variable replace earlier ones like extractImports())
+	def getImports(self):
+		with self.tablesLock:
+			if self.imports == None:
+				self.imports = dict(self.entries)
+			return self.imports
+
+	# changes should be the TextChange objects given to on_text_changed()
+	def updateFromTextChanges(self, changes):
+		changedRegions = []
+		for change in changes:
+			# the positions of each change are from before it was made so the ranges of the earlier 
+			# changes after it are moved along
+			shift = len(change.str) - (change.b.pt - change.a.pt)
+			for region in changedRegions:
+				if region[0] >= change.b.pt:
+					region[0] += shift
+					region[1] += shift
+			changedRegions.append([change.a.pt, change.a.pt + len(change.str)])
+		self.updateRegions([sublime.Region(a, b) for a, b in changedRegions])
+
+	# used when the edited ranges aren't given, the range between the start and end that are the 
+	# same as the text from the last update is re-matched (the cursors can't be relied on as undo, 
+	# pastes over selections and other commands change text away from them)
+	def updateFromText(self):
+		text = getViewText(self.view)
+		if self.text == None:
+			with self.tablesLock:
+				self.rebuild()
+			return
+		start = getCommonPrefixLength(self.text, text)
+		end = getCommonSuffixLength(self.text, text, min(len(self.text), len(text)) - start)
+		self.updateRegions([sublime.Region(start, len(text) - end)], text)
+
+	# re-matches the lines of the changed regions (which are for the current text)
+	def updateRegions(self, changedRegions, text=None):
+		with self.tablesLock:
+			regions = self.view.get_regions(IMPORT_REGIONS_KEY)
+			# regions are merged by sublime if the text between them is removed
+			if len(regions) != len(self.entries):
+				self.rebuild()
+				return
+
+			statements = list(zip(regions, self.entries))
+			for changedRegion in sorted(changedRegions, key=lambda region: region.begin()):
+				block = self.getSurroundingLines(changedRegion)
+				kept = []
+				for region, entry in statements:
+					if isRegionInBlock(region, block):
+						block = self.getSurroundingLines(block.cover(region))
+					else:
+						kept.append((region, entry))
+				statements = kept
+
+				# only lines that could contain an import statement are re-matched
+				content = self.view.substr(block)
+				if content.lower().find('import') == -1:
+					continue
+				for start, end, variableName, relativePath in findImports(content, block.begin()):
+					statements.append((sublime.Region(start, end), [variableName, relativePath]))
+				statements.sort(key=lambda statement: statement[0].begin())
+
+			self.entries = [entry for region, entry in statements]
+			self.setRegions([region for region, entry in statements], text)
+
+	# returns the lines of the region along with the lines either side of them (as the regex allows 
+	# a statement to be split over lines)
+	def getSurroundingLines(self, region):
+		lines = self.view.full_line(region)
+		return self.view.full_line(sublime.Region(max(0, lines.begin() - 1), min(self.view.size(), lines.end() + 1)))
+
+# the length of the start that both strings have (found by comparing halves of what's left as the 
+# slices are compared far quicker than each character could be)
+def getCommonPrefixLength(a, b):
+	low = 0
+	high = min(len(a), len(b))
+	while low < high:
+		mid = (low + high + 1) // 2
+		if a[low:mid] == b[low:mid]:
+			low = mid
+		else:
+			high = mid - 1
+	return low
+
+# the length of the end that both strings have (no longer than maxLength)
+def getCommonSuffixLength(a, b, maxLength):
+	low = 0
+	high = maxLength
+	while low < high:
+		mid = (low + high + 1) // 2
+		if a[len(a) - mid:len(a) - low] == b[len(b) - mid:len(b) - low]:
+			low = mid
+		else:
+			high = mid - 1
+	return low
+
+# true if the region is touched by the block of lines (removed statements leave empty regions which 
+# can be at the very end of the block when it's the end of the buffer)
+def isRegionInBlock(region, block):
+	return (region.begin() <= block.end()) and (max(region.end(), region.begin() + 1) > block.begin())
+
+if TEXT_CHANGE_LISTENER_AVAILABLE:
+	class ImportTableTextChangeListener(sublime_plugin.TextChangeListener):
+		@classmethod
+		def is_applicable(cls, buffer):
+			filePath = buffer.file_name()
+			return (filePath != None) and isVbScriptFile(filePath)
+
+		def on_text_changed(self, changes):
+			table = ViewImportTable.tables.get(self.buffer.id())
+			if table != None:
+				table.updateFromTextChanges(changes)
+
+# gets the words (in lower case) for the chain of variables before the word that the cursor is 
+# curently at e.g. ['a', 'b'] for 'a.b.cur' (empty if the word isn't preceeded by a '.')
+def getVariableTreeBeforeCursor(view):
 	# [0] is used because of the posiblility of multiple cursors
 	region = view.sel()[0]
 	# gets the start positions of the word that the cursor is currently at
 	wordStart = view.word(region).begin()
-	# get the word before the current one (possible a variable storing a library)
-	previousWordRegion = view.word( sublime.Region(wordStart-1, wordStart-1) )
-	# gets the string for the word from its region
-	preceedingWord = view.substr( previousWordRegion ).lower()
-	# gets the character after the word
-	charFollowing = view.substr( sublime.Region(previousWordRegion.end(), previousWordRegion.end()+1) )
-	return preceedingWord, charFollowing
-
-# extracts the methods of a class from a library file
-def extractMethods(content):
-	# finds all the strings that represent functions or subs and their parameters
-	# will return a iterable collection of MatchObjects (in this case) each with 7 
-	# groups. The first will contain the comments above the method the third the 
-	# scope of the method the forth the type of the method (e.g. Sub or Function)
-	# the sixth will be the methods name and the seventh will be the paramater list 
-	# or None if there aren't any
-	matches = re.finditer('((\\s*\'.*\\n)*)^\\s*(\\bPrivate\\b|\\bPublic\\b|)\\s*' \
-		+ '(\\bFunction\\b|\\bSub\\b|\\bProperty\\b\\s*(\\bLet\\b|\\bSet\\b|\\bGet\\b))\\s*(' \
-		+ VBSCRIPT_ALLOW_VAR_NAME_REGEX + ')\\s*(\\([a-zA-Z0-9\\,\\s]*\\))?$', content, \
-		re.IGNORECASE | re.MULTILINE)
-
-	# builds an array of the function and sub strings
-	methods = []
-	for match in matches:
-		comment, scope, methodType, methodParamsStr = formatMethodStr(match)
-		methods.append((comment, str(scope), str(methodParamsStr)))
 
+	words = []
+	pos = wordStart - 1
+	while True:
+		# get the word before the current one (possible a variable storing a library)
+		wordRegion = view.word( sublime.Region(pos, pos) )
+		# gets the character after the word
+		charAfter = view.substr( sublime.Region(wordRegion.end(), wordRegion.end()+1) )
+		if charAfter != '.':
+			return words
+
+		# gets the string for the word from its region
+		words.insert(0, view.substr(wordRegion).lower())
+
+		# gets the character before the word
+		charBefore = view.substr( sublime.Region(wordRegion.begin()-1, wordRegion.begin()) )
+		if charBefore != '.':
+			return words
+		pos = wordRegion.begin() - 1
+
+# builds the (trigger, contents) tuples shown in the auto-complete from the public properties and methods
+# (properties are tuples of the form (comment, scope, propertyName) and methods (comment, scope, methodParamsStr))
+def buildLibraryMatches(properties, methods):
+	matches = []
+	for prop in properties:
+		comment, scope, propertyName = prop
+		trigger, contents = buildTriggerAndContents(comment, propertyName)
+		matches.append(('$%s' % trigger, contents))
+
+	# elements of the matches array are tuples with a tiggers and the actualy contents
+	for method in methods:
+		comment, scope, methodParamsStr = method
+		trigger, contents = buildTriggerAndContents(comment, methodParamsStr)
+		matches.append((trigger, contents))
+	return matches
+
+# rough estimate of the memory used by the stored (trigger, contents) tuples of a library
+def estimateLibraryMethodsSize(matches):
+	return 64 + sum([160 + len(trigger) + len(contents) for trigger, contents in matches])
+
+# builds the (trigger, contents) tuples for the variables that store the libraries imported by a library
+def buildImportMatches(imports):
+	matches = []
+	for variableName in sorted(imports.keys()):
+		trigger, contents = buildTriggerAndContents('Import %s' % os.path.basename(imports[variableName]), \
+			variableName)
+		matches.append((trigger, contents))
+	return matches
+
+# extracts the methods of a class from a library file as a list of (comment, scope, methodParamsStr) tuples
+def extractMethods(content):
+	methods, properties = scanDeclarations(content)
 	return methods
 
+# extracts the properties of a class from a library file as a list of (comment, scope, propertyName) tuples
 def extractProperties(content):
-	# finds all the strings that represent functions or subs and their parameters
-	# will return a iterable collection of MatchObjects (in this case) each with 7 
-	# groups. The first will contain the comments above the method the third the 
-	# scope of the method the forth the type of the method (e.g. Sub or Function)
-	# the sixth will be the methods name and the seventh will be the paramater list 
-	# or None if there aren't any
-	matches = re.finditer('((\\s*\'.*\\n)*)^\\s*(\\bPrivate\\b|\\bPublic\\b)\\s*(' \
-		+ VBSCRIPT_ALLOW_VAR_NAME_REGEX + ')\\s*$', content, re.IGNORECASE | re.MULTILINE)
-
-	# builds an array of the function and sub strings
-	properties = []
-
-	for match in matches:
-		comment, scope, propertyName = formatPropertyStr(match)
-		properties.append((comment, str(scope), str(propertyName)))
-
+	methods, properties = scanDeclarations(content)
 	return properties
 
-# returns a sub string for the file that corresponds to the the class in the library 
-# file allowing for vbScript removing line continuation characters and putting the lines 
-# on one line instead
-def returnClassString(path):
-	content = ''
-	inClass = False
-	with openTryEncodings(path) as f:
-		for line in f:
-			writeLine = line.strip()
-
-			if writeLine[:5].lower() == 'class':
-				inClass = True
-			elif inClass and (writeLine[:3].lower() == 'end') and (writeLine[-5:].lower() == 'class'):
-				inClass = False
-
-			# if not inside a class the do nothing and continue to the next line
-			if not inClass:
-				continue
-
-			if len(writeLine) == 0:
-				continue
-			elif writeLine[-1] == '_':
-				content += writeLine[:-1]
-				continue
-
-			content += writeLine + '\n'
-	return content
-
-# extracts all the libraries that are imported by the specified one
-def extractImports(content):
-	# finds all the strings that represent relative paths of the libraries that are 
-	# imported will return a iterable collection of MatchObjects (in this case) each 
-	# with 2 groups. The first will contain variable name that the class is stored in the 
-	# second will contain the relative path of the library that the class comes from
-	matches = re.finditer('\\bSet\\b\\s*(' + VBSCRIPT_ALLOW_VAR_NAME_REGEX + \
-		')\\s*=\\s*\\bImport\\s*\\(\\s*"([a-zA-Z0-9\\.\\\\/]+)\\s*"\\s*\\)', content, re.IGNORECASE)
-
-	# builds an dictionary of the variables and their relative paths
-	imports = {}
-	for match in matches:
-		imports[match.group(1).lower()] = formatImportPath(match.group(2))
-
-	return imports
-
-# returns a string for a library file allowing for vbScript removing line continuation characters 
-# and putting the lines on one line instead
-def returnFileString(path):
-	content = ''
-	with openTryEncodings(path) as f:
-		for line in f:
-			writeLine = line.strip()
-
-			if len(writeLine) == 0:
-				continue
-			elif writeLine[-1] == '_':
-				content += writeLine[:-1]
-				continue
+# returns the [[path, file_last_updated_time], ... ] list used to check that memoized completions 
+# are still for the current versions of the libraries (in the snapshot of the folder)
+def getLibraryStamps(snapshot, paths):
+	return [[path, snapshot.getLastModified(path)] for path in paths]
 
-			content += writeLine + '\n'
-	return content
+def areLibraryStampsCurrent(snapshot, stamps):
+	for path, lastModified in stamps:
+		if (lastModified == None) or (snapshot.getLastModified(path) != lastModified):
+			return False
+	return True
 
 def getViewText(view):
 	numberOfChars = view.size()
 	content = view.substr( sublime.Region(0, numberOfChars) )
 	return content
 
-# removes newline character from comment and just returns the decription of the function
-# (for fancier comments of the form in the  /lib/Methods.qfl library)
-def getCommentDescription(inputComment):
-	if (not isinstance(inputComment, str)):
-		return None
-
-	commentLines = inputComment.split('\n')
-	output = ''
-	possibleDescKeywords = ['description', 'does']
-	METHOD_DESC_KEYWORDS_REGEX = '|'.join(possibleDescKeywords).lower()
-
-	# difference between re.search and re.match;
-	#    re.search - looks in whole string for first match
-	#    re.match - looks for a match that begins at the start of the string
-
-	# case for comments like thoose in the Methods.qfl library (fancier)
-	descMatchObj = re.search('(\\b' + METHOD_DESC_KEYWORDS_REGEX + '\\b)\\s*:', inputComment, re.IGNORECASE)
-	if (commentLines[0][:1] == "#") and (descMatchObj != None):
-
-		methodDescKeyword = descMatchObj.group(1).lower()
-
-		# boolean variable used to see if currently inside description part of the comment
-		pastDescLine = False
-		for line in commentLines:
-			keyWordMatchObj = re.match('\\b([a-z]*)\\b\\s*:', line, re.IGNORECASE)
-			# check to see if the line if of the form 'keyword :'
-			if keyWordMatchObj != None:
-				# gets the keyword from the regex match
-				keyWord = keyWordMatchObj.group(1).lower()
-				if keyWord == methodDescKeyword:
-					pastDescLine = True
-					# adds a line to the output adding in a space if required (ignoring the 
-					# 'description:' part)
-					output = addLineAutoCompleteComment(output, \
-						line[len(methodDescKeyword):].lstrip(' :'))
-				else:
-					# stops building the comment if the description has already been found
-					# and currently on a new keyword
-					if pastDescLine:
-						break
-			# if the line is of a normal form and currently in the description section
-			# then add that line to the comment
-			elif pastDescLine:
-				# adds a line to the output adding in a space if required
-				output = addLineAutoCompleteComment(output, line)
-	# default case
-	else:
-		for line in commentLines:
-			# adds a line to the output adding in a space if required
-			output = addLineAutoCompleteComment(output, line)
-	# returns the built comment removing any white space to the right
-	return output.rstrip()
-
-# adds a line to the output adding in a space if required (and ignoring some lines)
-def addLineAutoCompleteComment(comment, inputLine):
-	# remove unwanted "'" characters from right of string (will cause occational
-	# errors where something is meant the be quoted)
-	# used as lots of people start and end comments with the "'" character as opposed
-	# to just starting them with it
-	line = inputLine.strip(" '")
-	# ignore enpty lines
-	if len(line) == 0:
-		pass
-	# ignore spacer lines of '#' characters (maybe achange so ignores lines that
-	# are made of just one character)
-	elif line == '#' * len(line):
-		pass
-	elif line == '=' * len(line):
-		pass
-	else:
-		comment += line + ' '
-	return comment
-
-# formats the comment returned by the regular expression
-def formatComment(inputComment):
-	if isinstance(inputComment, str):
-		if inputComment == '':
-			return None
-		else:
-			comment = ''
-			lines = inputComment.strip(' \n').split('\n')
-			for line in lines:
-				comment += line.lstrip(" '\t") + '\n'
-			return comment
-	else:
-		return None
-	output = ''
-
-# returns a standard format for the library relative paths
-def formatImportPath(str):
-	str = str.lower()
-	
-	if str.find('.') != -1:
-		str = str[:str.find('.')]
-
-	str = str.replace('/', '\\')	
-	return str.strip('\\')
-
-def formatPropertyStr(match):
-	COMMENT_POS = 1
-	PROPERTY_SCOPE_POS = 3
-	PROPERTY_NAME_POS = 4
-
-	comment, scope = getCommentAndScope(match, COMMENT_POS, PROPERTY_SCOPE_POS)
-	propertyName = match.group(PROPERTY_NAME_POS)
-	return comment, scope, propertyName
-
-# removes white spaces and the words Function, Sub, ByVal and ByRef from the function definition string
-def formatMethodStr(match):
-	pattern = re.compile("(\\s+|\\bbyval\\b|\\bbyref\\b)", re.IGNORECASE)
-	COMMENT_POS = 1
-	METHOD_SCOPE_POS = 3
-	METHOD_TYPE_POS = 4
-	METHOD_NAME_POS = 6
-	PARAMATERS_POS = 7
-
-	comment, scope = getCommentAndScope(match, COMMENT_POS, METHOD_SCOPE_POS)
-
-	# case where there are no parmaters
-	if match.group(PARAMATERS_POS) == None:
-		methodParamsStr = match.group(METHOD_NAME_POS) + '()'
-	# case when there are paramaters
-	else:
-		methodParamsStr = match.group(METHOD_NAME_POS) + match.group(PARAMATERS_POS)
-
-	# removes white spaces and unwanted keywords
-	methodParamsStr = pattern.sub('', methodParamsStr)
-
-	# allows for different formatting of subs and functions
-	methodType = match.group(METHOD_TYPE_POS).lower()
-	if methodType in ('sub', 'property let', 'property set'):
-		methodParamsStr = methodParamsStr.replace('()', '').replace('(', ' ').replace(')', '')
-	return comment, scope, methodType, methodParamsStr
-
-def getCommentAndScope(match, comment_pos, scope_pos):
-	# gets the comment immedietly above the method name
-	comment = match.group(comment_pos)
-	if comment == None:
-		comment = ''
-
-	# removes whitespace and "'" character from left of comment lines
-	comment = formatComment(comment)
-	comment = getCommentDescription(comment)
-
-	# gets the scope of the method
-	if match.group(scope_pos) == None:
-		scope = 'public'
-	elif match.group(scope_pos) == '':
-		scope = 'public'
-	else:
-		scope = match.group(scope_pos).lower()
-	return comment, scope
-
 def buildTriggerAndContents(comment, keywordStr):
 	# options for both comments and no comments
 	if comment == None:
@@ -400,18 +797,34 @@ def buildTriggerAndContents(comment, keywordStr):
 	contents = keywordStr.replace('$', '\\$')
 	return trigger, contents
 
+def plugin_loaded():
+	settings = sublime.load_settings(SETTINGS_FILE_NAME)
+	applySettings(settings)
+	settings.clear_on_change('libraries')
+	settings.add_on_change('libraries', lambda: applySettings(settings))
+
+def applySettings(settings):
+	applyCacheSettings(settings)
+	ImportedClassesMethods.maxCompletionResults = settings.get('max_completion_results', 100)
+	FindVbscriptLibraryMethodCommand.maxResults = settings.get('max_symbol_search_results', 500)
+	Stats.enabled = settings.get('collect_timing_stats', False)
+
+# sets the limits of the library caches from the settings
+def applyCacheSettings(settings):
+	maxEntries = settings.get('max_cached_libraries', 200)
+	maxBytes = int(settings.get('max_cached_library_megabytes', 256) * 1024 * 1024)
+	ImportedClassesMethods.libraryMethodDetails.setLimits(maxEntries, maxBytes)
+	ImportDetails.LibraryDetailsCache.libraries.setLimits(maxEntries, maxBytes)
+
+Stats.addCacheReporter('libraryMethodDetails', ImportedClassesMethods.libraryMethodDetails.getStats)
+Stats.addCacheReporter('libraryDetails', ImportDetails.LibraryDetailsCache.libraries.getStats)
+
+# returns the path of the \TestLibrary\ directory the file is in (or None if it isn't in one)
+def getLibraryDirPath(filePath):
+	pos = filePath.lower().find(VBSCRIPT_LIBRARY_PARENT_FOLDER)
+	if pos < 0:
+		return None
+	return filePath[:pos + len(VBSCRIPT_LIBRARY_PARENT_FOLDER)]
+
 def isVbScriptFile(path):
 	return (os.path.splitext(path)[1].lower() in ('.vbs', '.qfl'))
-
-def openTryEncodings(path, encType='r'):
-	# can be found at 'https://docs.python.org/2.4/lib/standard-encodings.html'
-	# doesn't have correct encoding for .qfl files (must be saved again as UTF-8)
-	encodings = ['utf-8', 'utf-16', 'ascii']
-	for e in encodings:
-		try:
-			codecs.open(path, encType, e).read()
-			return codecs.open(path, encType, e)
-		except UnicodeDecodeError as e:
-			continue
-
-	raise Exception('no encoding found for the file %s' % path)
\ No newline at end of file
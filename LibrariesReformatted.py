@@ -6,28 +6,31 @@
 
 import sublime_plugin
 import sublime
+import threading
 #import re
 #import os
 #import sys
 #import codecs
 #import time
 
-# commented for now will need to add this (or something similar) when run as sublime package
-"""
-# adds the path of this module to the sys.path variable
-# this will allow custom imports to work no matter where this file is executed from
-path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-if not path in sys.path:
-	sys.path.insert(1, path)
-# cleans up the path variable
-del path
-"""
-
-import ImportDetails
+# sublime loads the plugin as '<Package>.<module>' without the package folder on sys.path while the
+# benchmarks and the command line tool import the modules directly
+if __package__:
+	from . import ImportDetails
+	from .VBScriptLibraryUtil.dependencies import extractImports
+	from .VBScriptLibraryUtil.snapshot import LibrarySnapshot
+	from .VBScriptLibraryUtil.workers import BackgroundParser, PRIORITY_VISIBLE, PRIORITY_BACKGROUND
+else:
+	import ImportDetails
+	from VBScriptLibraryUtil.dependencies import extractImports
+	from VBScriptLibraryUtil.snapshot import LibrarySnapshot
+	from VBScriptLibraryUtil.workers import BackgroundParser, PRIORITY_VISIBLE, PRIORITY_BACKGROUND
 
 FILE_FOLDER_NAME_REGEX = 'a-zA-Z0-9_\\-'
 LIBRARY_PARENT_FOLDER = '\\TestLibrary\\'
 POSSIBLE_SCRIPT_PARENT_FOLDERS = ['\\TestLibrary\\', '\\RegressionControl\\']
+# seconds the completions wait for an edited block to be re-parsed before giving up
+VIEW_PARSER_WAIT = 0.05
 
 def printScope(scope):
 	print('------------------------')
@@ -49,34 +52,145 @@ class ImportedClassesMethods(sublime_plugin.EventListener):
 
 		filePath = view.file_name()
 		# exits if not in a vbscript file
-		if not (ImportDetails.isVBScriptFile(filePath)):
+		if (filePath == None) or not (ImportDetails.isVBScriptFile(filePath)):
 			return []
 
 		# to get the preceeding word (which could be a varaible storing a library)
 		words = getVariableTreeBeforeCursor(view)
 
-		# TODO - change so uses actual view text (including edits) instead of the saved file
-		libDetails = ImportDetails.LibraryDetailsCache.getDetails(filePath)
-
-		#print(libDetails[0])
-		#print(libDetails[0].getVariable('aman').valueStr)
-		
-		print('fnc1 - %s' % libDetails[0].getSubBlock("fnc1").getScopeRange())
-		print('fnc1 - %s' % libDetails[0].getSubBlock("fnc1").getValue())
-		print('aman - %s' % libDetails[0].getVariable('aman').getValue())
-		print('user - %s' % libDetails[0].getVariable('user').getValue())
-		
-
-		#printScope(libDetails[0])
-		#printScope(libDetails[0].getLineCombinedScope(15))
-		a = libDetails[0].getLineCombinedScope(15)
-		print('DONE')
-		printScope(a)
+		# uses the view's text (including unsaved edits) which is only parsed in the background, the 
+		# standard suggestions are used until the first parse of the view has finished
+		viewParser = viewParsers.get(view.id())
+		if (viewParser == None) or (viewParser.changeCount != view.change_count()):
+			queueViewParser(view, PRIORITY_VISIBLE)
+		if (viewParser == None) or (len(words) == 0):
+			return []
+
+		# the scopes are only read while the parser isn't being updated, if an edited block isn't 
+		# re-parsed in time the standard suggestions are used
+		if not viewParser.lock.acquire(timeout=VIEW_PARSER_WAIT):
+			return []
+		try:
+			# the last scopes that could be parsed (e.g. from before an unfinished block was started)
+			libDetails = viewParser.getScopes()
+			if libDetails == None:
+				return []
+			# the class of the object the chain of words evaluates to at the cursor's line (memoized by 
+			# the resolver of the global scope until the view is re-parsed)
+			line = view.rowcol(locations[0])[0] + 1
+			value = libDetails[0].resolveExpression('.'.join(words), line)
+			if isinstance(value, ImportDetails.VBScriptBlockClass):
+				matches = buildClassMatches(value)
+		finally:
+			viewParser.lock.release()
+
 		# if an empty list is returned from this method then the standard sublime suggestions will be used
 		# this means that after any keyword that stores a library none of the standard suggestions will be 
 		# available but everywhere else it'll just display the standard auto-complete options
 		return matches
 
+	# the view is parsed in the background as soon as it's opened or switched to and then 
+	# re-parsed (only the edited blocks) after each modification
+	def on_load_async(self, view):
+		queueViewParser(view, PRIORITY_BACKGROUND)
+
+	def on_activated_async(self, view):
+		queueViewParser(view, PRIORITY_VISIBLE)
+
+	def on_modified_async(self, view):
+		if view.id() in viewParsers:
+			queueViewParser(view, PRIORITY_VISIBLE)
+
+	def on_close(self, view):
+		viewParsers.pop(view.id(), None)
+
+# the parser of a view's text which is only updated on the background parser threads, the lock 
+# stops the completions reading the scopes while they're being changed
+class ViewParser(object):
+	def __init__(self):
+		self.lock = threading.Lock()
+		# change count of the view when the parser was last updated
+		self.changeCount = None
+		self.parser = None
+
+	def update(self, view):
+		with self.lock:
+			changeCount = view.change_count()
+			if changeCount == self.changeCount:
+				return
+			text = getViewText(view)
+			if self.parser == None:
+				self.parser = ImportDetails.IncrementalVBScriptParser(text, view.file_name())
+			else:
+				self.parser.update(text)
+			self.changeCount = changeCount
+
+		if updateImportedLibraries(view.file_name(), text):
+			with self.lock:
+				# the values resolved before the libraries were parsed are dropped
+				scopes = self.getScopes()
+				if scopes != None:
+					scopes[0].resetScopeIndex()
+
+	# (only called while holding the lock)
+	def getScopes(self):
+		if self.parser == None:
+			return None
+		return self.parser.getScopes()
+
+# should be of the form {viewId:ViewParserInstance, ... }
+viewParsers = {}
+
+def queueViewParser(view, priority):
+	filePath = view.file_name()
+	if (filePath != None) and ImportDetails.isVBScriptFile(filePath):
+		BackgroundParser.getInstance().submit(('view', view.id()), lambda: updateViewParser(view), priority)
+
+# only called from the background parser threads
+def updateViewParser(view):
+	# the view may have been closed while this was queued
+	if not view.is_valid():
+		return
+	viewParsers.setdefault(view.id(), ViewParser()).update(view)
+
+# parses the libraries imported in the text (unless their current versions already have been) so 
+# that the resolver can use them from the completions without parsing, returns True if any were parsed
+def updateImportedLibraries(filePath, text):
+	libraryDirPath = ImportDetails.LibraryDetailsCache.getLibraryDirPath(filePath)
+	if libraryDirPath == None:
+		return False
+	# the imports are only resolved once the folder has been scanned
+	LibrarySnapshot.getSnapshot(libraryDirPath)
+
+	parsed = False
+	for relativePath in set(extractImports(text).values()):
+		path = ImportDetails.LibraryDetailsCache.resolveImportPath(filePath, relativePath)
+		if (path == None) or (ImportDetails.LibraryDetailsCache.getReadyDetails(path) != None):
+			continue
+		try:
+			ImportDetails.LibraryDetailsCache.updateDetails(path)
+			parsed = True
+		except ValueError:
+			# the library has unclosed blocks
+			pass
+	return parsed
+
+def getViewText(view):
+	return view.substr( sublime.Region(0, view.size()) )
+
+# builds the (trigger, contents) tuples for the public methods and properties of a class
+def buildClassMatches(classBlock):
+	matches = []
+	for block in classBlock.getSubBlocks():
+		if (block.scope.lower() == 'private') or (block.getName().lower() in ('class_initialize', 'class_terminate')):
+			continue
+		if isinstance(block, ImportDetails.VBScriptBlockMethod) and (len(block.params) > 0):
+			contents = '%s(%s)' % (block.getName(), ', '.join([param.name for param in block.params]))
+		else:
+			contents = block.getName()
+		matches.append(('%s\t%s' % (contents, block.__class__.__name__[len('VBScriptBlock'):]), contents))
+	return matches
+
 # gets the word preceeding the word that the cursor is curently at
 def getVariableTreeBeforeCursor(view):
 	# [0] is used because of the posiblility of multiple cursors
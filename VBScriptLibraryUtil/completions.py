@@ -0,0 +1,96 @@
+# sorted index of the completions of a library so that only the ones matching what has been typed
+# are given to sublime (ranked by prefix, then camel humps e.g. 'gv' for 'getValue', then fuzzy)
+
+import bisect, re
+
+# splits a name into its humps e.g. 'getHTTPValue' into ['get', 'HTTP', 'Value']
+HUMP_REGEX = re.compile('[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z0-9]+|[A-Z]+')
+# sorts after any other character so that bisect can find the end of the keys with a prefix
+MAX_KEY_CHAR = '\uffff'
+
+class CompletionIndex(object):
+	# matches should be a list of the (trigger, contents) tuples
+	def __init__(self, matches):
+		self.matches = matches
+		# of the form [(lowerCaseName, (trigger, contents), [hump1, hump2, ... ]), ... ] sorted by name
+		self.entries = sorted([(getCompletionName(match[0]).lower(), match, getNameHumps(getCompletionName(match[0]))) \
+			for match in matches], key=lambda entry: entry[0])
+		self.keys = [entry[0] for entry in self.entries]
+		# the camel hump and fuzzy matches of the last query (as the query is normally typed a 
+		# character at a time the matches for the next query are only looked for in these)
+		self.lastSearch = ('', range(len(self.entries)))
+
+	def __len__(self):
+		return len(self.matches)
+
+	# returns up to limit of the (trigger, contents) tuples matching the prefix best first
+	def search(self, prefix, limit):
+		prefix = prefix.lower()
+		start = bisect.bisect_left(self.keys, prefix)
+		end = bisect.bisect_left(self.keys, prefix + MAX_KEY_CHAR)
+		results = [self.entries[i][1] for i in range(start, min(end, start + limit))]
+		if (len(results) >= limit) or (prefix == ''):
+			return results
+
+		# the rest are only looked for when there aren't enough names starting with the prefix
+		lastQuery, candidates = self.lastSearch
+		if not prefix.startswith(lastQuery):
+			candidates = range(len(self.entries))
+
+		humpMatches = []
+		fuzzyMatches = []
+		matched = []
+		for i in candidates:
+			key, match, humps = self.entries[i]
+			if matchesHumps(prefix, humps, 0):
+				matched.append(i)
+				if not (start <= i < end):
+					humpMatches.append(match)
+				continue
+			score = getFuzzyScore(prefix, key)
+			if score != None:
+				matched.append(i)
+				if not (start <= i < end):
+					fuzzyMatches.append((score, len(key), i, match))
+		self.lastSearch = (prefix, matched)
+
+		results.extend(humpMatches[:limit - len(results)])
+		fuzzyMatches.sort(key=lambda fuzzyMatch: fuzzyMatch[:3])
+		results.extend([fuzzyMatch[3] for fuzzyMatch in fuzzyMatches[:limit - len(results)]])
+		return results
+
+# returns the name being completed from the trigger e.g. 'getValue' for "getValue(a,b)\t'comment"
+def getCompletionName(trigger):
+	name = trigger.split('\t', 1)[0].lstrip('$')
+	pos = name.find('(')
+	if pos != -1:
+		name = name[:pos]
+	return name.strip()
+
+def getNameHumps(name):
+	return [hump.lower() for hump in HUMP_REGEX.findall(name)]
+
+# true if the query is made of the starts of the humps (the first hump must be used but later
+# ones can be skipped e.g. 'gv' and 'getv' both match 'getHTTPValue')
+def matchesHumps(query, humps, humpPos):
+	if query == '':
+		return True
+	for pos in range(humpPos, len(humps) if humpPos > 0 else min(1, len(humps))):
+		hump = humps[pos]
+		for length in range(min(len(query), len(hump)), 0, -1):
+			if (hump[:length] == query[:length]) and matchesHumps(query[length:], humps, pos + 1):
+				return True
+	return False
+
+# returns the number of characters between the first and last characters of the query when they
+# appear in order in the key (lower is a closer match) or None if they don't
+def getFuzzyScore(query, key):
+	first = -1
+	pos = -1
+	for char in query:
+		pos = key.find(char, pos + 1)
+		if pos == -1:
+			return None
+		if first == -1:
+			first = pos
+	return pos - first
@@ -0,0 +1,276 @@
+# finds the method and property declarations (and the comments above them) in the class strings 
+# built by returnClassString() with a single pass over the lines
+
+import re
+
+from .encoding import readLibraryText
+from .stats import Stats
+
+VBSCRIPT_ALLOW_VAR_NAME_REGEX = '\\b[a-zA-Z]{1}[a-zA-Z0-9_]{,254}\\b'
+
+# matched against a single line. the groups are the scope of the method, the type of the method 
+# (e.g. Sub or Function), the Let, Set or Get of a property, the methods name and the paramater 
+# list (or None if there aren't any)
+METHOD_DECLARATION_REGEX = re.compile('^\\s*(\\bPrivate\\b|\\bPublic\\b|)\\s*' \
+	+ '(\\bFunction\\b|\\bSub\\b|\\bProperty\\b\\s*(\\bLet\\b|\\bSet\\b|\\bGet\\b))\\s*(' \
+	+ VBSCRIPT_ALLOW_VAR_NAME_REGEX + ')\\s*(\\([a-zA-Z0-9\\,\\s]*\\))?$', re.IGNORECASE)
+METHOD_SCOPE_POS = 1
+METHOD_TYPE_POS = 2
+METHOD_NAME_POS = 4
+PARAMATERS_POS = 5
+
+# matched against a single line. the groups are the scope and the name of the property
+PROPERTY_DECLARATION_REGEX = re.compile('^\\s*(\\bPrivate\\b|\\bPublic\\b)\\s*(' \
+	+ VBSCRIPT_ALLOW_VAR_NAME_REGEX + ')\\s*$', re.IGNORECASE)
+PROPERTY_SCOPE_POS = 1
+PROPERTY_NAME_POS = 2
+
+METHOD_PARAMS_IGNORE_REGEX = re.compile("(\\s+|\\bbyval\\b|\\bbyref\\b)", re.IGNORECASE)
+
+# returns the tuple (methods, properties) where methods is a list of (comment, scope, methodParamsStr)
+# tuples and properties a list of (comment, scope, propertyName) tuples
+#
+# gives the same results as searching the whole string with the regex '((\s*'.*\n)*)^' followed by the 
+# declaration did but without it's backtracking (which was re-tried at the start of every line of a 
+# comment block so got very slow for libraries with long comment banners). as with the old regexes the 
+# comment is the block of comment lines directly above the declaration along with the end of the line 
+# before that block from its first "'" character (when that line comes after the previous declaration)
+def scanDeclarations(content):
+	lines = content.split('\n')
+	methods = []
+	properties = []
+	# position of the first line of the comment block above the current line
+	commentStart = None
+	# position of the line after the last declaration found of each type 
+	methodSearchStart = 0
+	propertySearchStart = 0
+
+	for pos in range(len(lines)):
+		line = lines[pos]
+		if line[:1] == "'":
+			if commentStart == None:
+				commentStart = pos
+			continue
+
+		if commentStart == None:
+			commentStart = pos
+
+		match = METHOD_DECLARATION_REGEX.match(line)
+		if match != None:
+			comment = getDeclarationComment(lines, commentStart, pos, methodSearchStart)
+			methods.append(formatMethodStr(comment, match))
+			methodSearchStart = pos + 1
+
+		match = PROPERTY_DECLARATION_REGEX.match(line)
+		if match != None:
+			comment = getDeclarationComment(lines, commentStart, pos, propertySearchStart)
+			properties.append(formatPropertyStr(comment, match))
+			propertySearchStart = pos + 1
+
+		commentStart = None
+
+	return methods, properties
+
+# returns the raw comment for the declaration on the line declarationPos where the comment block 
+# above it starts on the line commentStart
+def getDeclarationComment(lines, commentStart, declarationPos, searchStart):
+	commentLines = lines[commentStart:declarationPos]
+	# the part of the line before the comment block from its first "'" character is treated as a comment line
+	previousPos = commentStart - 1
+	if previousPos >= searchStart:
+		quotePos = lines[previousPos].find("'")
+		if quotePos >= 0:
+			commentLines.insert(0, lines[previousPos][quotePos:])
+
+	if len(commentLines) == 0:
+		return ''
+	return '\n'.join(commentLines) + '\n'
+
+def formatPropertyStr(comment, match):
+	comment, scope = getCommentAndScope(comment, match.group(PROPERTY_SCOPE_POS))
+	propertyName = match.group(PROPERTY_NAME_POS)
+	return comment, str(scope), str(propertyName)
+
+# removes white spaces and the words Function, Sub, ByVal and ByRef from the function definition string
+def formatMethodStr(comment, match):
+	comment, scope = getCommentAndScope(comment, match.group(METHOD_SCOPE_POS))
+
+	# case where there are no parmaters
+	if match.group(PARAMATERS_POS) == None:
+		methodParamsStr = match.group(METHOD_NAME_POS) + '()'
+	# case when there are paramaters
+	else:
+		methodParamsStr = match.group(METHOD_NAME_POS) + match.group(PARAMATERS_POS)
+
+	# removes white spaces and unwanted keywords
+	methodParamsStr = METHOD_PARAMS_IGNORE_REGEX.sub('', methodParamsStr)
+
+	# allows for different formatting of subs and functions
+	methodType = match.group(METHOD_TYPE_POS).lower()
+	if methodType in ('sub', 'property let', 'property set'):
+		methodParamsStr = methodParamsStr.replace('()', '').replace('(', ' ').replace(')', '')
+	return comment, str(scope), str(methodParamsStr)
+
+def getCommentAndScope(comment, scope):
+	# gets the comment immedietly above the method name
+	if comment == None:
+		comment = ''
+
+	# removes whitespace and "'" character from left of comment lines
+	comment = formatComment(comment)
+	comment = getCommentDescription(comment)
+
+	# gets the scope of the method
+	if scope == None:
+		scope = 'public'
+	elif scope == '':
+		scope = 'public'
+	else:
+		scope = scope.lower()
+	return comment, scope
+
+# removes newline character from comment and just returns the decription of the function
+# (for fancier comments of the form in the  /lib/Methods.qfl library)
+def getCommentDescription(inputComment):
+	if (not isinstance(inputComment, str)):
+		return None
+
+	commentLines = inputComment.split('\n')
+	output = ''
+	possibleDescKeywords = ['description', 'does']
+	METHOD_DESC_KEYWORDS_REGEX = '|'.join(possibleDescKeywords).lower()
+
+	# difference between re.search and re.match;
+	#    re.search - looks in whole string for first match
+	#    re.match - looks for a match that begins at the start of the string
+
+	# case for comments like thoose in the Methods.qfl library (fancier)
+	descMatchObj = re.search('(\\b' + METHOD_DESC_KEYWORDS_REGEX + '\\b)\\s*:', inputComment, re.IGNORECASE)
+	if (commentLines[0][:1] == "#") and (descMatchObj != None):
+
+		methodDescKeyword = descMatchObj.group(1).lower()
+
+		# boolean variable used to see if currently inside description part of the comment
+		pastDescLine = False
+		for line in commentLines:
+			keyWordMatchObj = re.match('\\b([a-z]*)\\b\\s*:', line, re.IGNORECASE)
+			# check to see if the line if of the form 'keyword :'
+			if keyWordMatchObj != None:
+				# gets the keyword from the regex match
+				keyWord = keyWordMatchObj.group(1).lower()
+				if keyWord == methodDescKeyword:
+					pastDescLine = True
+					# adds a line to the output adding in a space if required (ignoring the 
+					# 'description:' part)
+					output = addLineAutoCompleteComment(output, \
+						line[len(methodDescKeyword):].lstrip(' :'))
+				else:
+					# stops building the comment if the description has already been found
+					# and currently on a new keyword
+					if pastDescLine:
+						break
+			# if the line is of a normal form and currently in the description section
+			# then add that line to the comment
+			elif pastDescLine:
+				# adds a line to the output adding in a space if required
+				output = addLineAutoCompleteComment(output, line)
+	# default case
+	else:
+		for line in commentLines:
+			# adds a line to the output adding in a space if required
+			output = addLineAutoCompleteComment(output, line)
+	# returns the built comment removing any white space to the right
+	return output.rstrip()
+
+# adds a line to the output adding in a space if required (and ignoring some lines)
+def addLineAutoCompleteComment(comment, inputLine):
+	# remove unwanted "'" characters from right of string (will cause occational
+	# errors where something is meant the be quoted)
+	# used as lots of people start and end comments with the "'" character as opposed
+	# to just starting them with it
+	line = inputLine.strip(" '")
+	# ignore enpty lines
+	if len(line) == 0:
+		pass
+	# ignore spacer lines of '#' characters (maybe achange so ignores lines that
+	# are made of just one character)
+	elif line == '#' * len(line):
+		pass
+	elif line == '=' * len(line):
+		pass
+	else:
+		comment += line + ' '
+	return comment
+
+# formats the comment returned by the regular expression
+def formatComment(inputComment):
+	if isinstance(inputComment, str):
+		if inputComment == '':
+			return None
+		else:
+			comment = ''
+			lines = inputComment.strip(' \n').split('\n')
+			for line in lines:
+				comment += line.lstrip(" '\t") + '\n'
+			return comment
+	else:
+		return None
+	output = ''
+
+# returns the (methods, properties) of the classes in the library ignoring the private ones (these 
+# are what is shown in the completions and stored in the index). the file is only read if its text
+# isn't given
+def extractPublicDeclarations(path, text=None):
+	content = returnClassString(path, text)
+	with Stats.timer('extract'):
+		methods, properties = scanDeclarations(content)
+	methods = [method for method in methods if method[1] != 'private']
+	properties = [prop for prop in properties if prop[1] != 'private']
+	return methods, properties
+
+# returns a sub string for the file that corresponds to the the class in the library 
+# file allowing for vbScript removing line continuation characters and putting the lines 
+# on one line instead
+def returnClassString(path, text=None):
+	if text == None:
+		text = readLibraryText(path)
+	content = ''
+	inClass = False
+	for line in text.splitlines():
+		writeLine = line.strip()
+
+		if writeLine[:5].lower() == 'class':
+			inClass = True
+		elif inClass and (writeLine[:3].lower() == 'end') and (writeLine[-5:].lower() == 'class'):
+			inClass = False
+
+		# if not inside a class the do nothing and continue to the next line
+		if not inClass:
+			continue
+
+		if len(writeLine) == 0:
+			continue
+		elif writeLine[-1] == '_':
+			content += writeLine[:-1]
+			continue
+
+		content += writeLine + '\n'
+	return content
+
+# returns a string for a library file allowing for vbScript removing line continuation characters 
+# and putting the lines on one line instead (the file is only read if its text isn't given)
+def returnFileString(path, text=None):
+	if text == None:
+		text = readLibraryText(path)
+	content = ''
+	for line in text.splitlines():
+		writeLine = line.strip()
+
+		if len(writeLine) == 0:
+			continue
+		elif writeLine[-1] == '_':
+			content += writeLine[:-1]
+			continue
+
+		content += writeLine + '\n'
+	return content
@@ -0,0 +1,219 @@
+# graph of the libraries that each library imports with Import("...") so that the members of 
+# chained imports (e.g. 'a.b.') can be resolved
+
+import re, threading
+
+from .declarations import VBSCRIPT_ALLOW_VAR_NAME_REGEX
+
+# the first group is the variable name that the class is stored in and the second the relative
+# path of the library that the class comes from
+IMPORT_REGEX = re.compile('\\bSet\\b\\s*(' + VBSCRIPT_ALLOW_VAR_NAME_REGEX + \
+	')\\s*=\\s*\\bImport\\s*\\(\\s*"([a-zA-Z0-9\\.\\\\/]+)\\s*"\\s*\\)', re.IGNORECASE)
+
+# extracts all the libraries that are imported by the specified one
+def extractImports(content):
+	# builds an dictionary of the variables and their relative paths
+	imports = {}
+	for start, end, variableName, relativePath in findImports(content):
+		imports[variableName] = relativePath
+
+	return imports
+
+# returns a list of the form [[start, end, variableName, relativePath], ... ] for the import 
+# statements in the content in the order they appear (offset is added to the positions)
+def findImports(content, offset=0):
+	statements = []
+	for match in IMPORT_REGEX.finditer(content):
+		statements.append([match.start() + offset, match.end() + offset, match.group(1).lower(), \
+			formatImportPath(match.group(2))])
+
+	return statements
+
+# returns a standard format for the library relative paths
+def formatImportPath(str):
+	str = str.lower()
+	
+	if str.find('.') != -1:
+		str = str[:str.find('.')]
+
+	str = str.replace('/', '\\')	
+	return str.strip('\\')
+
+class LibraryNode(object):
+	def __init__(self, path):
+		self.path = path
+		# False until the library's imports have been read (nodes are added for imported libraries first)
+		self.scanned = False
+		# last modified time of the file when its imports were read
+		self.lastModified = None
+		# of the form {variableName:libraryPath, ... } for the libraries that this one imports
+		self.imports = {}
+		# paths of the libraries that import this one
+		self.dependents = set()
+		# memoized chain resolutions of the form {(variableName1, variableName2, ...):libraryPath, ... }
+		self.resolvedChains = {}
+		# memoized completion entries for the library (its members and the libraries it imports)
+		self.memberTable = None
+
+class LibraryDependencyGraph(object):
+	# of the form {libraryDirPath:LibraryDependencyGraphInstance, ... }
+	graphs = {}
+	graphsLock = threading.Lock()
+
+	# resolveImportPath is called with the relative path of an import and returns the full path of 
+	# the library or None if it doesn't exist
+	def __init__(self, resolveImportPath):
+		self.resolveImportPath = resolveImportPath
+		# of the form {path:LibraryNodeInstance, ... }
+		self.nodes = {}
+		# imports that complete a cycle of the form set([(importingPath, importedPath), ... ])
+		self.cycles = set()
+		# the graph is updated from the background parser threads
+		self.lock = threading.RLock()
+
+	@classmethod
+	def getGraph(cls, libraryDirPath, resolveImportPath):
+		with cls.graphsLock:
+			if not (libraryDirPath in cls.graphs):
+				cls.graphs[libraryDirPath] = LibraryDependencyGraph(resolveImportPath)
+			return cls.graphs[libraryDirPath]
+
+	# the imports that complete a cycle in each graph of the form {libraryDirPath:[[importingPath, 
+	# importedPath], ... ], ... } (only the graphs with cycles are included)
+	@classmethod
+	def getCycles(cls):
+		with cls.graphsLock:
+			graphs = list(cls.graphs.items())
+		cycles = {}
+		for libraryDirPath, graph in graphs:
+			with graph.lock:
+				if len(graph.cycles) > 0:
+					cycles[libraryDirPath] = sorted([list(cycle) for cycle in graph.cycles])
+		return cycles
+
+	# drops the memoized completion entries for the library from every graph (used when the 
+	# library's details are evicted from the cache so they aren't kept in memory here instead)
+	@classmethod
+	def dropMemberTables(cls, path):
+		with cls.graphsLock:
+			graphs = list(cls.graphs.values())
+		for graph in graphs:
+			with graph.lock:
+				node = graph.nodes.get(path)
+				if node != None:
+					node.memberTable = None
+
+	# returns True if the imports of the current version of the library have been read
+	def isNodeCurrent(self, path, lastModified):
+		node = self.nodes.get(path)
+		return (node != None) and node.scanned and (node.lastModified == lastModified)
+
+	# replaces the imports of the library with the ones found in its contents (as returned by 
+	# extractImports()), returns the paths of the imported libraries whose own imports have not been 
+	# read yet
+	def updateNode(self, path, relativeImports, lastModified):
+		imports = {}
+		for variableName, relativePath in relativeImports.items():
+			importPath = self.resolveImportPath(relativePath)
+			if importPath != None:
+				imports[variableName] = importPath
+
+		with self.lock:
+			node = self.addNode(path)
+			self.invalidate(path)
+
+			# removes the old edges
+			for importPath in node.imports.values():
+				self.nodes[importPath].dependents.discard(path)
+				self.cycles.discard((path, importPath))
+
+			node.imports = imports
+			for importPath in imports.values():
+				# an import cycle is allowed (resolving 'a.b.a.b.' only follows the variables) but is 
+				# recorded so it's shown in the stats report
+				if self.isReachable(importPath, path):
+					self.cycles.add((path, importPath))
+				self.addNode(importPath).dependents.add(path)
+
+			node.scanned = True
+			node.lastModified = lastModified
+			return [importPath for importPath in set(imports.values()) if not self.nodes[importPath].scanned]
+
+	def addNode(self, path):
+		if not (path in self.nodes):
+			self.nodes[path] = LibraryNode(path)
+		return self.nodes[path]
+
+	# returns True if the library toPath is imported by fromPath (directly or through other libraries)
+	def isReachable(self, fromPath, toPath):
+		visited = set()
+		toVisit = [fromPath]
+		while len(toVisit) > 0:
+			path = toVisit.pop()
+			if path == toPath:
+				return True
+			if path in visited:
+				continue
+			visited.add(path)
+			node = self.nodes.get(path)
+			if node != None:
+				toVisit.extend(node.imports.values())
+		return False
+
+	# clears the memoized results for the library and every library that imports it (directly or 
+	# through other libraries) as only their chain resolutions can depend on it
+	def invalidate(self, path):
+		with self.lock:
+			node = self.nodes.get(path)
+			if node == None:
+				return
+			node.memberTable = None
+
+			visited = set()
+			toVisit = [path]
+			while len(toVisit) > 0:
+				ancestorPath = toVisit.pop()
+				if ancestorPath in visited:
+					continue
+				visited.add(ancestorPath)
+				ancestor = self.nodes[ancestorPath]
+				ancestor.resolvedChains = {}
+				toVisit.extend(ancestor.dependents)
+
+	# returns the path of the library stored in the chain of variables starting from the library at
+	# path (e.g. ['b', 'c'] for 'a.b.c.' where a is the library at path) or None if it can't be 
+	# resolved (yet)
+	def resolveChain(self, path, variableNames):
+		key = tuple(variableNames)
+		with self.lock:
+			node = self.nodes.get(path)
+			if (node == None) or not node.scanned:
+				return None
+			if key in node.resolvedChains:
+				return node.resolvedChains[key]
+
+			current = node
+			for variableName in variableNames:
+				importPath = current.imports.get(variableName)
+				if importPath == None:
+					current = None
+					break
+				current = self.nodes[importPath]
+				# not memoized as it's resolvable once the library's imports have been read
+				if not current.scanned:
+					return None
+
+			resolvedPath = None if current == None else current.path
+			node.resolvedChains[key] = resolvedPath
+			return resolvedPath
+
+	# returns the memoized completion entries for the library building them with 
+	# buildMemberTable(node) if needed
+	def getMemberTable(self, path, buildMemberTable):
+		with self.lock:
+			node = self.nodes.get(path)
+			if node == None:
+				return buildMemberTable(None)
+			if node.memberTable == None:
+				node.memberTable = buildMemberTable(node)
+			return node.memberTable
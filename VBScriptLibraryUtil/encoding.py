@@ -0,0 +1,85 @@
+# reads library files with a single read and decode (the encoding found for each file is cached
+# so it doesn't have to be found again until the file changes)
+
+import os, codecs, time
+
+from .stats import Stats
+from .filestamp import getFileStamp
+
+# can be found at 'https://docs.python.org/3/library/codecs.html#standard-encodings'
+# the byte order marks and the encodings they are for (utf-8-sig removes the BOM)
+BYTE_ORDER_MARKS = [(codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), \
+	(codecs.BOM_UTF16_BE, 'utf-16')]
+# tried in order for files without a BOM (.qfl files saved by QTP are normally cp1252 and latin-1 
+# is the last resort for the few bytes that cp1252 doesn't define)
+FALLBACK_ENCODINGS = ['utf-8', 'cp1252', 'latin-1']
+# number of bytes looked at to see if a file without a BOM is utf-16
+UTF16_SNIFF_BYTES = 512
+
+class FileEncodingNotFoundException(Exception):
+	def __init__(self,*args,**kwargs):
+		Exception.__init__(self,*args,**kwargs)
+
+# of the form {path:(lastModified, size, encoding), ... }
+encodingCache = {}
+
+# returns the decoded contents of the file
+def readLibraryText(path):
+	return readLibraryFile(path)[0]
+
+# returns the tuple (text, stamp) where stamp is the FileStamp of the version of the file that was read
+def readLibraryFile(path):
+	with Stats.timer('read'):
+		takenAt = time.time()
+		stat = os.stat(path)
+		with open(path, 'rb') as f:
+			data = f.read()
+		stamp = getFileStamp(stat, data, takenAt)
+
+	with Stats.timer('decode'):
+		cached = encodingCache.get(path)
+		if (cached != None) and (cached[0] == stat.st_mtime) and (cached[1] == stat.st_size):
+			try:
+				return data.decode(cached[2]), stamp
+			except UnicodeDecodeError:
+				pass
+
+		text, encoding = decodeLibraryBytes(data, path)
+	encodingCache[path] = (stat.st_mtime, stat.st_size, encoding)
+	return text, stamp
+
+# returns the tuple (text, encoding) for the contents of a file
+def decodeLibraryBytes(data, path=''):
+	encoding = sniffEncoding(data)
+	if encoding != None:
+		try:
+			return data.decode(encoding), encoding
+		except UnicodeDecodeError:
+			pass
+
+	for encoding in FALLBACK_ENCODINGS:
+		try:
+			return data.decode(encoding), encoding
+		except UnicodeDecodeError:
+			continue
+
+	raise FileEncodingNotFoundException('no encoding found for the file %s' % path)
+
+# returns the encoding given by the byte order mark or (for utf-16 files without one) the pattern 
+# of zero bytes, otherwise None
+def sniffEncoding(data):
+	for bom, encoding in BYTE_ORDER_MARKS:
+		if data.startswith(bom):
+			return encoding
+
+	# ascii text saved as utf-16 has every other byte as zero
+	sample = data[:UTF16_SNIFF_BYTES]
+	if len(sample) >= 2:
+		evenZeros = sample[0::2].count(0)
+		oddZeros = sample[1::2].count(0)
+		half = len(sample) // 2
+		if oddZeros > half * 0.9 and evenZeros == 0:
+			return 'utf-16-le'
+		if evenZeros > half * 0.9 and oddZeros == 0:
+			return 'utf-16-be'
+	return None
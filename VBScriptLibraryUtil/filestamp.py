@@ -0,0 +1,77 @@
+# stamps of the versions of the libraries that have been parsed (the last modified time, size and a
+# hash of the contents) so that the cached details are only dropped when the contents really change.
+# sync tools on network shares change the times without changing the contents and a file rewritten
+# within the resolution of its time can keep the same time so the time can't be trusted on its own
+
+import os, time, hashlib
+
+# a file changed this close (in seconds) to when its stamp was taken could be changed again without
+# its last modified time changing (e.g. the 2 second times of FAT drives) so its contents are checked
+RACY_SECONDS = 2
+
+class FileStamp(object):
+	__slots__ = ('lastModified', 'size', 'contentHash', 'takenAt')
+
+	# takenAt is the time the contents were hashed (at which the file had the last modified time)
+	def __init__(self, lastModified, size, contentHash, takenAt):
+		self.lastModified = lastModified
+		self.size = size
+		self.contentHash = contentHash
+		self.takenAt = takenAt
+
+	# stamps are stored in the persistent index as dictionaries
+	@classmethod
+	def fromEntry(cls, entry):
+		return FileStamp(entry['mtime'], entry['size'], entry.get('hash'), entry.get('stampedAt', 0))
+
+	def toEntry(self):
+		return {'mtime':self.lastModified, 'size':self.size, 'hash':self.contentHash, 'stampedAt':self.takenAt}
+
+	# true if the file could have been changed without its last modified time changing
+	def isRacy(self):
+		return (self.takenAt - self.lastModified) < RACY_SECONDS
+
+	# checked without reading the file (used on the completion path)
+	def isSameVersion(self, lastModified, size):
+		return (self.size == size) and (self.lastModified == lastModified)
+
+	# true if the file with the last modified time and size has the contents the stamp was taken of.
+	# the file is only read when the size is the same but the time has changed (or the stamp is racy)
+	# and if it's only been touched the stamp is updated so it isn't read again
+	def matches(self, path, lastModified, size):
+		if self.size != size:
+			return False
+		if (self.lastModified == lastModified) and not self.isRacy():
+			return True
+
+		takenAt = time.time()
+		try:
+			contentHash = hashFile(path)
+		except (IOError, OSError):
+			return False
+		if (self.contentHash == None) or (contentHash != self.contentHash):
+			return False
+		self.lastModified = lastModified
+		self.takenAt = takenAt
+		return True
+
+	# stats the file first (returns False if it's missing)
+	def matchesFile(self, path):
+		try:
+			stat = os.stat(path)
+		except OSError:
+			return False
+		return self.matches(path, stat.st_mtime, stat.st_size)
+
+# returns the stamp for the contents of a file read just after it was stat'ed
+def getFileStamp(stat, data, takenAt):
+	return FileStamp(stat.st_mtime, stat.st_size, hashContents(data), takenAt)
+
+# sha1 is used as it's in every python build (including the one in sublime text 3) and hashes
+# faster than the files can be read
+def hashContents(data):
+	return hashlib.sha1(data).hexdigest()
+
+def hashFile(path):
+	with open(path, 'rb') as f:
+		return hashContents(f.read())
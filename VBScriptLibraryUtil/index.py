@@ -0,0 +1,275 @@
+# persistent index of the public members of the libraries in a TestLibrary folder
+# stored next to the libraries so that a warm start doesn't need to parse them again
+#
+# the index can be built outside of sublime (e.g. by a nightly job) with a process pool with:
+# usage: python -m VBScriptLibraryUtil.index <TestLibrary folder> [--processes N] [--slowest N] [--force]
+
+import os, sys, json, codecs, threading, time, argparse, multiprocessing
+
+# the parent package is only there when loaded by sublime, the command line tool imports the parser directly
+try:
+	from .. import ImportDetails
+except (ImportError, ValueError):
+	import ImportDetails
+from .encoding import readLibraryFile
+from .filestamp import FileStamp
+from .snapshot import iterLibraryFiles
+
+INDEX_FILE_NAME = '.vbscript-libraries-index.json'
+# needs increasing whenever the format of the entries changes (old indexes are then ignored)
+INDEX_FORMAT_VERSION = 4
+
+class LibraryIndex(object):
+	# of the form {libraryDirPath:LibraryIndexInstance, ... }
+	indexes = {}
+	indexesLock = threading.Lock()
+
+	def __init__(self, libraryDirPath):
+		self.libraryDirPath = libraryDirPath
+		self.indexPath = os.path.join(libraryDirPath, INDEX_FILE_NAME)
+		# of the form {relativePath:{'mtime':..., 'size':..., 'hash':..., 'stampedAt':..., 'methods':[...], 
+		# 'properties':[...], 'scopes':[...], 'imports':{...}, 'error':...}, ... } (the file stamp is stored 
+		# with FileStamp.toEntry() and the error is only there if the library couldn't be parsed)
+		self.entries = {}
+		# the entries that have been changed since the index was last written of the form 
+		# {relativePath:entry, ... } where the entry is None if it was removed (they're merged with 
+		# the entries on disk if another process has written the index since)
+		self.changes = {}
+		# the (mtime, size) of the index file when it was last read or written (None if it wasn't there)
+		self.fileVersion = None
+		# libraries are indexed from the background parser threads
+		self.lock = threading.Lock()
+		self.load()
+
+	# returns the index for the library folder (loading it from disk the first time it's used and 
+	# again whenever it has been written by another process e.g. python -m VBScriptLibraryUtil.index)
+	@classmethod
+	def getIndex(cls, libraryDirPath):
+		key = os.path.normcase(os.path.abspath(libraryDirPath))
+		with cls.indexesLock:
+			if not (key in cls.indexes):
+				cls.indexes[key] = LibraryIndex(libraryDirPath)
+				return cls.indexes[key]
+			index = cls.indexes[key]
+		index.reloadIfChanged()
+		return index
+
+	def formatKey(self, path):
+		return os.path.relpath(path, self.libraryDirPath).replace('/', '\\').lower()
+
+	def load(self):
+		with self.lock:
+			self.fileVersion, self.entries = readIndexFile(self.indexPath)
+
+	# re-reads the index if another process has written it since it was read (the entries changed 
+	# here that haven't been written yet are kept)
+	def reloadIfChanged(self):
+		with self.lock:
+			if getFileVersion(self.indexPath) != self.fileVersion:
+				self.mergeFromFile()
+
+	# (only called while holding the lock)
+	def mergeFromFile(self):
+		self.fileVersion, entries = readIndexFile(self.indexPath)
+		for key, entry in self.changes.items():
+			if entry == None:
+				entries.pop(key, None)
+			# the other process's entry is kept if it's of a newer version of the library
+			elif (not (key in entries)) or (entries[key].get('stampedAt', 0) <= entry.get('stampedAt', 0)):
+				entries[key] = entry
+		self.entries = entries
+
+	def save(self):
+		with self.lock:
+			if len(self.changes) == 0:
+				return
+			# the entries written by another process since the index was read aren't overwritten
+			if getFileVersion(self.indexPath) != self.fileVersion:
+				self.mergeFromFile()
+
+			data = {'version':INDEX_FORMAT_VERSION, 'entries':self.entries}
+			# written to a temporary file first so that a reader never sees a half written index
+			tempPath = '%s.%d.tmp' % (self.indexPath, os.getpid())
+			try:
+				with codecs.open(tempPath, 'w', 'utf-8') as f:
+					json.dump(data, f, separators=(',', ':'))
+				os.replace(tempPath, self.indexPath)
+				self.changes = {}
+				self.fileVersion = getFileVersion(self.indexPath)
+			except (IOError, OSError):
+				# read only library folders just don't get a persistent index
+				if os.path.isfile(tempPath):
+					os.remove(tempPath)
+
+	# returns the stored entry for the library or None if it's missing or the file has changed since 
+	# (the file is only stat'ed if the last modified time and size aren't given and only read if the 
+	# time has changed but the size hasn't). if readFile is False the file is never read so the entry
+	# is only returned if the time and size match
+	def getEntry(self, path, lastModified=None, size=None, readFile=True):
+		key = self.formatKey(path)
+		if not (key in self.entries):
+			return None
+
+		entry = self.entries[key]
+		if (lastModified == None) or (size == None):
+			try:
+				stat = os.stat(path)
+			except OSError:
+				self.removeEntry(path)
+				return None
+			lastModified = stat.st_mtime
+			size = stat.st_size
+
+		stamp = FileStamp.fromEntry(entry)
+		if not readFile:
+			return entry if stamp.isSameVersion(lastModified, size) else None
+		if not stamp.matches(path, lastModified, size):
+			return None
+		# the file was only touched so the new time is stored (saved along with the next change)
+		if (stamp.lastModified != entry['mtime']) or (stamp.takenAt != entry.get('stampedAt')):
+			with self.lock:
+				entry.update(stamp.toEntry())
+				self.changes[key] = entry
+		return entry
+
+	# methods and properties are lists of (comment, scope, name) tuples as returned by extractMethods() 
+	# and extractProperties(), the scopes a list of [blockType, name, startLine, endLine] lists and the 
+	# imports the {variableName:relativePath} dictionary from extractImports() (the file is only read if 
+	# the FileStamp of the parsed version isn't given). the error is the message of why the library 
+	# couldn't be parsed (e.g. unclosed blocks) which is reported until it's fixed
+	def setEntry(self, path, methods, properties, scopes, imports, stamp=None, error=None):
+		if stamp == None:
+			stamp = readLibraryFile(path)[1]
+		entry = stamp.toEntry()
+		entry['methods'] = [list(method) for method in methods]
+		entry['properties'] = [list(prop) for prop in properties]
+		entry['scopes'] = scopes
+		entry['imports'] = dict(imports)
+		if error != None:
+			entry['error'] = error
+		key = self.formatKey(path)
+		with self.lock:
+			self.entries[key] = entry
+			self.changes[key] = entry
+
+	def removeEntry(self, path):
+		key = self.formatKey(path)
+		with self.lock:
+			if self.entries.pop(key, None) != None:
+				self.changes[key] = None
+
+	# removes the entries of the libraries that are no longer in the folder
+	def removeMissingEntries(self, paths):
+		keys = set([self.formatKey(path) for path in paths])
+		with self.lock:
+			for key in list(self.entries.keys()):
+				if not (key in keys):
+					del self.entries[key]
+					self.changes[key] = None
+
+# the (mtime, size) of the file or None if it's missing
+def getFileVersion(path):
+	try:
+		stat = os.stat(path)
+	except OSError:
+		return None
+	return (stat.st_mtime, stat.st_size)
+
+# returns the tuple (fileVersion, entries) for the index file (the entries are empty if the file is 
+# missing, unreadable or of an old format)
+def readIndexFile(indexPath):
+	fileVersion = getFileVersion(indexPath)
+	if fileVersion == None:
+		return None, {}
+
+	try:
+		with codecs.open(indexPath, 'r', 'utf-8') as f:
+			data = json.load(f)
+	except (IOError, OSError, ValueError):
+		# a corrupt or unreadable index is just rebuilt
+		return fileVersion, {}
+
+	if data.get('version') != INDEX_FORMAT_VERSION:
+		return fileVersion, {}
+	return fileVersion, data.get('entries', {})
+
+# run in the worker processes, returns the tuple (path, (methods, properties, scopes, imports, stamp), 
+# error, seconds) where the entry is None if the library couldn't be read. a library with unclosed blocks 
+# has an error along with its entry (its declarations are still found but it has no scopes)
+def indexLibrary(path):
+	start = time.time()
+	try:
+		# the stamp is of the text that is parsed so a change while it's parsed is found
+		library = ImportDetails.LibraryDetails(path)
+		methods, properties = library.getPublicDeclarations()
+		entry = (methods, properties, library.getScopeRanges(), library.getImports(), library.stamp)
+		error = library.getParseError()
+	except Exception as e:
+		entry = None
+		error = '%s: %s' % (e.__class__.__name__, e)
+	return path, entry, error, time.time() - start
+
+# parses the libraries that have changed since they were indexed (or all of them if force is True)
+# across a process pool and saves the index, returns the list of (path, error) failures
+def buildIndex(libraryDirPath, processes=None, slowest=10, force=False, out=sys.stdout):
+	start = time.time()
+	index = LibraryIndex(libraryDirPath)
+	libraryFiles = list(iterLibraryFiles(libraryDirPath))
+	index.removeMissingEntries([path for path, lastModified, size in libraryFiles])
+
+	paths = []
+	failures = []
+	for path, lastModified, size in libraryFiles:
+		entry = None if force else index.getEntry(path, lastModified, size)
+		if entry == None:
+			paths.append(path)
+		# the libraries that couldn't be parsed before are failures until they're fixed
+		elif entry.get('error') != None:
+			failures.append((path, entry['error']))
+	out.write('%d libraries found, %d to parse\n' % (len(libraryFiles), len(paths)))
+
+	timings = []
+	if len(paths) > 0:
+		pool = multiprocessing.Pool(processes)
+		try:
+			for path, entry, error, seconds in pool.imap_unordered(indexLibrary, paths, chunksize=4):
+				timings.append((seconds, path))
+				if error != None:
+					failures.append((path, error))
+				if entry == None:
+					index.removeEntry(path)
+				else:
+					methods, properties, scopes, imports, stamp = entry
+					index.setEntry(path, methods, properties, scopes, imports, stamp, error)
+		finally:
+			pool.close()
+			pool.join()
+	index.save()
+
+	elapsed = time.time() - start
+	out.write('parsed %d libraries in %.2fs (%.1f files/s)\n' % (len(paths), elapsed, len(paths) / max(elapsed, 1e-6)))
+	if len(failures) > 0:
+		out.write('\n%d failures:\n' % len(failures))
+		for path, error in sorted(failures):
+			out.write('  %s: %s\n' % (os.path.relpath(path, libraryDirPath), error))
+	if (slowest > 0) and (len(timings) > 0):
+		out.write('\nslowest libraries:\n')
+		for seconds, path in sorted(timings, reverse=True)[:slowest]:
+			out.write('  %8.3fs  %s\n' % (seconds, os.path.relpath(path, libraryDirPath)))
+	return failures
+
+def main():
+	parser = argparse.ArgumentParser(description='builds the index of the libraries in a TestLibrary folder')
+	parser.add_argument('libraryDirPath', help='the TestLibrary folder')
+	parser.add_argument('--processes', type=int, default=None, help='worker processes (defaults to the number of CPUs)')
+	parser.add_argument('--slowest', type=int, default=10, help='number of the slowest libraries reported')
+	parser.add_argument('--force', action='store_true', help='re-parses the libraries that are already indexed')
+	args = parser.parse_args()
+
+	if not os.path.isdir(args.libraryDirPath):
+		parser.error('%s is not a folder' % args.libraryDirPath)
+	failures = buildIndex(args.libraryDirPath, args.processes, args.slowest, args.force)
+	sys.exit(1 if len(failures) > 0 else 0)
+
+if __name__ == '__main__':
+	main()
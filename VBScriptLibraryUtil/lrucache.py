@@ -0,0 +1,131 @@
+# least recently used cache with limits on the number of entries and their estimated size in bytes
+# (entries can be pinned, e.g. the libraries imported by open views, so they are never evicted)
+
+import threading
+from collections import OrderedDict
+
+class LRUCache(object):
+	# sizeOf is called with each value added and returns its estimated size in bytes and onEvict 
+	# with the key and value of each entry evicted
+	def __init__(self, maxEntries=None, maxBytes=None, sizeOf=None, onEvict=None):
+		self.maxEntries = maxEntries
+		self.maxBytes = maxBytes
+		self.sizeOf = sizeOf
+		self.onEvict = onEvict
+		# of the form {key:[value, size], ... } with the least recently used first
+		self.entries = OrderedDict()
+		self.totalBytes = 0
+		# of the form {owner:set([key, ... ]), ... }
+		self.pins = {}
+		self.pinnedKeys = set()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		# used from the background parser threads as well as sublime's
+		self.lock = threading.RLock()
+
+	def setLimits(self, maxEntries=None, maxBytes=None):
+		with self.lock:
+			self.maxEntries = maxEntries
+			self.maxBytes = maxBytes
+			self.evict()
+
+	def __len__(self):
+		return len(self.entries)
+
+	# checking for a key doesn't count as using it
+	def __contains__(self, key):
+		return key in self.entries
+
+	def __getitem__(self, key):
+		with self.lock:
+			if not (key in self.entries):
+				self.misses += 1
+				raise KeyError(key)
+			self.hits += 1
+			self.entries.move_to_end(key)
+			return self.entries[key][0]
+
+	def get(self, key, default=None):
+		try:
+			return self[key]
+		except KeyError:
+			return default
+
+	def __setitem__(self, key, value):
+		size = self.sizeOf(value) if self.sizeOf != None else 0
+		with self.lock:
+			if key in self.entries:
+				self.totalBytes -= self.entries[key][1]
+			self.entries[key] = [value, size]
+			self.entries.move_to_end(key)
+			self.totalBytes += size
+			self.evict()
+
+	def pop(self, key, default=None):
+		with self.lock:
+			if not (key in self.entries):
+				return default
+			value, size = self.entries.pop(key)
+			self.totalBytes -= size
+			return value
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.totalBytes = 0
+
+	# replaces the keys pinned by the owner (e.g. a view's id) with the ones given
+	def pin(self, owner, keys):
+		with self.lock:
+			self.pins[owner] = set(keys)
+			self.updatePinnedKeys()
+
+	def unpin(self, owner):
+		with self.lock:
+			if self.pins.pop(owner, None) != None:
+				self.updatePinnedKeys()
+				self.evict()
+
+	def updatePinnedKeys(self):
+		self.pinnedKeys = set()
+		for keys in self.pins.values():
+			self.pinnedKeys.update(keys)
+
+	def isPinned(self, key):
+		return key in self.pinnedKeys
+
+	def isOverLimit(self):
+		if (self.maxEntries != None) and (len(self.entries) > self.maxEntries):
+			return True
+		return (self.maxBytes != None) and (self.totalBytes > self.maxBytes)
+
+	# removes the least recently used entries that aren't pinned until the cache is within its limits
+	def evict(self):
+		if not self.isOverLimit():
+			return
+
+		for key in list(self.entries.keys()):
+			if not self.isOverLimit():
+				return
+			if key in self.pinnedKeys:
+				continue
+			value = self.pop(key)
+			self.evictions += 1
+			if self.onEvict != None:
+				self.onEvict(key, value)
+
+	def getStats(self):
+		with self.lock:
+			lookups = self.hits + self.misses
+			return {
+				'entries':len(self.entries),
+				'estimatedBytes':self.totalBytes,
+				'maxEntries':self.maxEntries,
+				'maxBytes':self.maxBytes,
+				'pinned':len(self.pinnedKeys),
+				'hits':self.hits,
+				'misses':self.misses,
+				'evictions':self.evictions,
+				'hitRatio':(float(self.hits) / lookups) if lookups > 0 else None
+			}
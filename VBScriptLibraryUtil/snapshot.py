@@ -0,0 +1,150 @@
+# snapshot of the library files in a TestLibrary folder so that resolving imports and checking if
+# libraries have changed doesn't need to touch the disk (each stat is slow on network shares)
+
+import os, time, threading
+
+from .dependencies import formatImportPath
+
+# extensions of the library files in the order they are used when both exist
+LIBRARY_EXTENSIONS = ['.vbs', '.qfl']
+# seconds before a snapshot is rescanned in the background (so changes made outside of sublime
+# are found), changes saved in sublime update the snapshot straight away
+SNAPSHOT_MAX_AGE = 30
+# python 3.3 (used by sublime text 3) doesn't have os.scandir
+SCANDIR_AVAILABLE = hasattr(os, 'scandir')
+
+class LibrarySnapshot(object):
+	# of the form {libraryDirPath:LibrarySnapshotInstance, ... }
+	snapshots = {}
+	snapshotsLock = threading.Lock()
+
+	def __init__(self, libraryDirPath):
+		self.libraryDirPath = libraryDirPath
+		# of the form {relativePath:(path, extension, lastModified, size), ... } where the relative
+		# paths are in the format of formatImportPath() (as the whole folder is scanned, a relative
+		# path that isn't in it is a library that is known to be missing)
+		self.files = {}
+		# of the form {normcasePath:relativePath, ... }
+		self.paths = {}
+		self.scannedAt = None
+		self.lock = threading.Lock()
+
+	# returns the snapshot for the library folder (scanning it the first time it's used)
+	@classmethod
+	def getSnapshot(cls, libraryDirPath):
+		snapshot = cls.getExistingSnapshot(libraryDirPath)
+		if snapshot == None:
+			snapshot = LibrarySnapshot(libraryDirPath)
+			snapshot.rescan()
+			with cls.snapshotsLock:
+				snapshot = cls.snapshots.setdefault(getSnapshotKey(libraryDirPath), snapshot)
+		return snapshot
+
+	# returns None if the folder hasn't been scanned yet
+	@classmethod
+	def getExistingSnapshot(cls, libraryDirPath):
+		return cls.snapshots.get(getSnapshotKey(libraryDirPath))
+
+	def rescan(self):
+		files = {}
+		for path, lastModified, size in iterLibraryFiles(self.libraryDirPath):
+			addLibraryFile(files, self.getRelativePath(path), path, lastModified, size)
+
+		paths = {}
+		for relativePath, libraryFile in files.items():
+			paths[os.path.normcase(libraryFile[0])] = relativePath
+
+		with self.lock:
+			self.files = files
+			self.paths = paths
+			self.scannedAt = time.time()
+
+	def isStale(self):
+		return (self.scannedAt == None) or (time.time() - self.scannedAt > SNAPSHOT_MAX_AGE)
+
+	# re-reads a single library (e.g. once it's been saved) including finding if it's been
+	# created or removed since the last scan
+	def updateFile(self, path):
+		relativePath = self.getRelativePath(path)
+		basePath = os.path.splitext(path)[0]
+		files = {}
+		for extension in LIBRARY_EXTENSIONS:
+			try:
+				stat = os.stat(basePath + extension)
+			except OSError:
+				continue
+			addLibraryFile(files, relativePath, basePath + extension, stat.st_mtime, stat.st_size)
+
+		with self.lock:
+			oldFile = self.files.pop(relativePath, None)
+			if oldFile != None:
+				self.paths.pop(os.path.normcase(oldFile[0]), None)
+			if relativePath in files:
+				self.files[relativePath] = files[relativePath]
+				self.paths[os.path.normcase(files[relativePath][0])] = relativePath
+
+	# returns the full path of the library with the relative path used in an import or None if
+	# there isn't one
+	def resolve(self, relativePath):
+		libraryFile = self.files.get(formatImportPath(relativePath))
+		if libraryFile == None:
+			return None
+		return libraryFile[0]
+
+	# returns the (path, extension, lastModified, size) tuple for the library or None if it's missing
+	def getFile(self, path):
+		relativePath = self.paths.get(os.path.normcase(path))
+		if relativePath == None:
+			return None
+		return self.files.get(relativePath)
+
+	def getLastModified(self, path):
+		libraryFile = self.getFile(path)
+		if libraryFile == None:
+			return None
+		return libraryFile[2]
+
+	def getRelativePath(self, path):
+		return formatImportPath(os.path.relpath(path, self.libraryDirPath).replace(os.sep, '\\'))
+
+def getSnapshotKey(libraryDirPath):
+	return os.path.normcase(os.path.abspath(libraryDirPath))
+
+# adds the library to the files dictionary unless a library with an extension used before its
+# one has the same relative path
+def addLibraryFile(files, relativePath, path, lastModified, size):
+	extension = os.path.splitext(path)[1].lower()
+	existing = files.get(relativePath)
+	if (existing != None) and (LIBRARY_EXTENSIONS.index(existing[1]) <= LIBRARY_EXTENSIONS.index(extension)):
+		return
+	files[relativePath] = (path, extension, lastModified, size)
+
+# yields a (path, lastModified, size) tuple for each library file in the folder and its sub folders
+# (hidden folders e.g. '.git' are skipped)
+def iterLibraryFiles(dirPath):
+	toVisit = [dirPath]
+	while len(toVisit) > 0:
+		currentDirPath = toVisit.pop()
+		try:
+			if SCANDIR_AVAILABLE:
+				entries = [(entry.name, entry.path, entry) for entry in os.scandir(currentDirPath)]
+			else:
+				entries = [(name, os.path.join(currentDirPath, name), None) for name in os.listdir(currentDirPath)]
+		except OSError:
+			continue
+
+		for name, path, entry in entries:
+			try:
+				# the type is known from the scandir entry without a stat on most systems
+				isDir = entry.is_dir() if entry != None else os.path.isdir(path)
+				if isDir:
+					if not name.startswith('.'):
+						toVisit.append(path)
+					continue
+				if not (os.path.splitext(name)[1].lower() in LIBRARY_EXTENSIONS):
+					continue
+				# cached by the scandir entry on windows
+				stat = entry.stat() if entry != None else os.stat(path)
+			except OSError:
+				continue
+			yield path, stat.st_mtime, stat.st_size
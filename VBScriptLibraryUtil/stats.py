@@ -0,0 +1,136 @@
+# opt in timers for the stages of reading, parsing and completing libraries (turned on with the
+# 'collect_timing_stats' setting) which are dumped as JSON by the dump_vbscript_library_stats command
+
+import time, math, threading
+
+# the histogram buckets grow by this factor from MIN_BUCKET_SECONDS so the percentiles are
+# within about 20% of the real times
+BUCKET_GROWTH = 1.2
+MIN_BUCKET_SECONDS = 1e-6
+
+class StageHistogram(object):
+	def __init__(self):
+		# of the form {bucketNumber:count, ... } where bucket n holds the times up to
+		# MIN_BUCKET_SECONDS * BUCKET_GROWTH ** n
+		self.buckets = {}
+		self.count = 0
+		self.totalSeconds = 0.0
+		self.maxSeconds = 0.0
+
+	def add(self, seconds):
+		if seconds <= MIN_BUCKET_SECONDS:
+			bucket = 0
+		else:
+			bucket = int(math.ceil(math.log(seconds / MIN_BUCKET_SECONDS, BUCKET_GROWTH)))
+		self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+		self.count += 1
+		self.totalSeconds += seconds
+		self.maxSeconds = max(self.maxSeconds, seconds)
+
+	# returns the upper bound of the bucket the percentile falls in
+	def getPercentile(self, percentile):
+		if self.count == 0:
+			return None
+		target = self.count * percentile / 100.0
+		seen = 0
+		for bucket in sorted(self.buckets.keys()):
+			seen += self.buckets[bucket]
+			if seen >= target:
+				return min(MIN_BUCKET_SECONDS * BUCKET_GROWTH ** bucket, self.maxSeconds)
+		return self.maxSeconds
+
+	def getReport(self):
+		return {
+			'count':self.count,
+			'totalMs':self.totalSeconds * 1000,
+			'meanMs':(self.totalSeconds / self.count * 1000) if self.count > 0 else None,
+			'p50Ms':toMilliseconds(self.getPercentile(50)),
+			'p95Ms':toMilliseconds(self.getPercentile(95)),
+			'p99Ms':toMilliseconds(self.getPercentile(99)),
+			'maxMs':self.maxSeconds * 1000
+		}
+
+# times the code in a with block and adds it to the stage's histogram
+class StageTimer(object):
+	__slots__ = ('stage', 'start')
+
+	def __init__(self, stage):
+		self.stage = stage
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, excType, excValue, excTraceback):
+		Stats.record(self.stage, time.perf_counter() - self.start)
+		return False
+
+# used when the stats are turned off so the hot path only pays for an empty with block
+class NullTimer(object):
+	__slots__ = ()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, excTraceback):
+		return False
+
+NULL_TIMER = NullTimer()
+
+class Stats(object):
+	enabled = False
+	# of the form {stageName:StageHistogramInstance, ... }
+	stages = {}
+	# of the form {cacheName:[hits, misses], ... }
+	lookups = {}
+	# functions returning the stats of other caches (e.g. LRUCache.getStats) of the form {cacheName:function, ... }
+	cacheReporters = {}
+	lock = threading.Lock()
+
+	@classmethod
+	def timer(cls, stage):
+		if not cls.enabled:
+			return NULL_TIMER
+		return StageTimer(stage)
+
+	@classmethod
+	def record(cls, stage, seconds):
+		with cls.lock:
+			if not (stage in cls.stages):
+				cls.stages[stage] = StageHistogram()
+			cls.stages[stage].add(seconds)
+
+	@classmethod
+	def recordLookup(cls, cache, hit):
+		if not cls.enabled:
+			return
+		with cls.lock:
+			counts = cls.lookups.setdefault(cache, [0, 0])
+			counts[0 if hit else 1] += 1
+
+	@classmethod
+	def addCacheReporter(cls, cache, getStats):
+		cls.cacheReporters[cache] = getStats
+
+	@classmethod
+	def reset(cls):
+		with cls.lock:
+			cls.stages = {}
+			cls.lookups = {}
+
+	@classmethod
+	def getReport(cls):
+		with cls.lock:
+			stages = dict([(stage, histogram.getReport()) for stage, histogram in cls.stages.items()])
+			caches = {}
+			for cache, counts in cls.lookups.items():
+				hits, misses = counts
+				caches[cache] = {'hits':hits, 'misses':misses, 'hitRatio':float(hits) / (hits + misses)}
+		for cache, getStats in cls.cacheReporters.items():
+			caches[cache] = getStats()
+		return {'enabled':cls.enabled, 'stages':stages, 'caches':caches}
+
+def toMilliseconds(seconds):
+	if seconds == None:
+		return None
+	return seconds * 1000
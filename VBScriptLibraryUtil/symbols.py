@@ -0,0 +1,275 @@
+# inverted index of the words in the names and descriptions of the public methods and properties of
+# the libraries in a TestLibrary folder (used by the find_vbscript_library_method command). it's built
+# from the entries of the persistent LibraryIndex so searching never parses or reads a library
+#
+# the index can be searched outside of sublime (once it's been built) with:
+# usage: python -m VBScriptLibraryUtil.symbols <TestLibrary folder> <query> [--limit N]
+
+import os, sys, re, bisect, heapq, threading, time, argparse
+
+from .completions import getNameHumps, MAX_KEY_CHAR
+from .index import LibraryIndex
+from .snapshot import iterLibraryFiles
+
+# the name at the start of the method strings of the entries e.g. 'getValue' for 'getValue(a,b)'
+SYMBOL_NAME_REGEX = re.compile('[a-z_][a-z0-9_]*', re.IGNORECASE)
+# the words of the descriptions and queries
+SYMBOL_WORD_REGEX = re.compile('[a-z0-9]+', re.IGNORECASE)
+# names of the classes of the blocks (from getScopeRanges()) the members are declared in
+CLASS_BLOCK_NAME = 'VBScriptBlockClass'
+
+class LibrarySymbol(object):
+	__slots__ = ('path', 'name', 'signature', 'description', 'className', 'lineNumber', 'isProperty')
+
+	def __init__(self, path, name, signature, description, className, lineNumber, isProperty):
+		self.path = path
+		self.name = name
+		self.signature = signature
+		self.description = description
+		self.className = className
+		# 0 when the line isn't known (e.g. the libraries with unclosed blocks)
+		self.lineNumber = lineNumber
+		self.isProperty = isProperty
+
+class SymbolIndex(object):
+	# of the form {libraryDirPath:SymbolIndexInstance, ... }
+	indexes = {}
+	indexesLock = threading.Lock()
+
+	def __init__(self, libraryDirPath):
+		self.libraryDirPath = libraryDirPath
+		# of the form {symbolId:LibrarySymbolInstance, ... }
+		self.symbols = {}
+		# of the form {path:(version, [symbolId, ... ]), ... } where the version is from getEntryVersion()
+		self.files = {}
+		# of the form {token:set([symbolId, ... ]), ... } for the humps of the names and the words of
+		# the descriptions
+		self.nameTokens = {}
+		self.descriptionTokens = {}
+		# sorted lists of the tokens and of the (lowerCaseName, symbolId) tuples so that prefixes can be
+		# found with bisect (sorted again at the end of each update())
+		self.sortedNameTokens = None
+		self.sortedDescriptionTokens = None
+		self.sortedNames = None
+		self.nextSymbolId = 0
+		# updated from the background parser threads and searched from sublime's
+		self.lock = threading.RLock()
+
+	# returns the index for the library folder (which is empty until update() is called)
+	@classmethod
+	def getIndex(cls, libraryDirPath):
+		key = os.path.normcase(os.path.abspath(libraryDirPath))
+		with cls.indexesLock:
+			if not (key in cls.indexes):
+				cls.indexes[key] = SymbolIndex(libraryDirPath)
+			return cls.indexes[key]
+
+	def __len__(self):
+		return len(self.symbols)
+
+	# brings the symbols up to date with the entries of the libraries in the LibraryIndex (the
+	# libraries whose entries haven't changed since the last update are skipped and the ones that
+	# aren't in paths are removed)
+	def update(self, libraryIndex, paths):
+		with libraryIndex.lock:
+			entries = [(path, libraryIndex.entries.get(libraryIndex.formatKey(path))) for path in paths]
+
+		with self.lock:
+			current = set()
+			for path, entry in entries:
+				if entry == None:
+					continue
+				current.add(path)
+				version = getEntryVersion(entry)
+				indexed = self.files.get(path)
+				if (indexed != None) and (indexed[0] == version):
+					continue
+				self.removeFile(path)
+				self.addFile(path, version, entry)
+
+			for path in list(self.files.keys()):
+				if not (path in current):
+					self.removeFile(path)
+			# sorted here (off the search path) rather than on the first search
+			self.buildSortedKeys()
+
+	def addFile(self, path, version, entry):
+		symbolIds = []
+		for symbol in buildLibrarySymbols(path, entry):
+			symbolId = self.nextSymbolId
+			self.nextSymbolId += 1
+			self.symbols[symbolId] = symbol
+			symbolIds.append(symbolId)
+			for token in getNameTokens(symbol.name):
+				self.nameTokens.setdefault(token, set()).add(symbolId)
+			for token in getWords(symbol.description):
+				self.descriptionTokens.setdefault(token, set()).add(symbolId)
+		self.files[path] = (version, symbolIds)
+		self.invalidate()
+
+	def removeFile(self, path):
+		indexed = self.files.pop(path, None)
+		if indexed == None:
+			return
+		for symbolId in indexed[1]:
+			symbol = self.symbols.pop(symbolId)
+			removePostings(self.nameTokens, getNameTokens(symbol.name), symbolId)
+			removePostings(self.descriptionTokens, getWords(symbol.description), symbolId)
+		self.invalidate()
+
+	def invalidate(self):
+		self.sortedNameTokens = None
+		self.sortedDescriptionTokens = None
+		self.sortedNames = None
+
+	def buildSortedKeys(self):
+		if self.sortedNames != None:
+			return
+		self.sortedNameTokens = sorted(self.nameTokens.keys())
+		self.sortedDescriptionTokens = sorted(self.descriptionTokens.keys())
+		self.sortedNames = sorted([(symbol.name.lower(), symbolId) for symbolId, symbol in self.symbols.items()])
+
+	# returns up to limit of the LibrarySymbols matching every word of the query best first. the
+	# names starting with the query come first (in order), then those with a hump or word starting
+	# with each word of the query and then those matching with the words of their descriptions
+	def search(self, query, limit):
+		words = getWords(query)
+		if len(words) == 0:
+			return []
+
+		with self.lock:
+			self.buildSortedKeys()
+			# the query typed as a name (ignoring any spaces) e.g. 'get value' for 'getValue'
+			namePrefix = ''.join(words)
+			start = bisect.bisect_left(self.sortedNames, (namePrefix,))
+			end = bisect.bisect_left(self.sortedNames, (namePrefix + MAX_KEY_CHAR,))
+			results = [self.symbols[symbolId] for name, symbolId in self.sortedNames[start:min(end, start + limit)]]
+			if len(results) >= limit:
+				return results
+
+			# the rest are only looked for when there aren't enough names starting with the query
+			found = set([symbolId for name, symbolId in self.sortedNames[start:end]])
+			nameMatches = None
+			allMatches = None
+			for word in words:
+				wordNameMatches = getPrefixPostings(self.nameTokens, self.sortedNameTokens, word)
+				wordMatches = wordNameMatches | getPrefixPostings(self.descriptionTokens, self.sortedDescriptionTokens, word)
+				nameMatches = wordNameMatches if nameMatches == None else (nameMatches & wordNameMatches)
+				allMatches = wordMatches if allMatches == None else (allMatches & wordMatches)
+
+			for matches in (nameMatches, allMatches):
+				matches = matches - found
+				found |= matches
+				best = heapq.nsmallest(limit - len(results), matches, key=lambda symbolId: self.getSortKey(symbolId))
+				results.extend([self.symbols[symbolId] for symbolId in best])
+			return results
+
+	# shorter names first (the closest matches for the query) then by name and library
+	def getSortKey(self, symbolId):
+		symbol = self.symbols[symbolId]
+		return (len(symbol.name), symbol.name.lower(), symbol.path)
+
+# changes whenever the library is indexed again
+def getEntryVersion(entry):
+	return (entry['size'], entry.get('hash') or entry['mtime'])
+
+# builds the LibrarySymbols from the methods and properties of an entry of the LibraryIndex (the
+# lines are found from its scopes)
+def buildLibrarySymbols(path, entry):
+	classes = []
+	blockLines = {}
+	for blockType, name, startLine, endLine in entry.get('scopes', []):
+		if blockType == CLASS_BLOCK_NAME:
+			classes.append((startLine, endLine, name))
+		else:
+			blockLines.setdefault(name.lower(), startLine)
+
+	symbols = []
+	for comment, scope, signature in entry['methods']:
+		match = SYMBOL_NAME_REGEX.match(signature)
+		if match == None:
+			continue
+		name = match.group(0)
+		lineNumber = blockLines.get(name.lower(), 0)
+		symbols.append(LibrarySymbol(path, name, signature, comment, getClassName(classes, lineNumber), \
+			lineNumber, False))
+
+	# the lines of the public variables aren't stored so the line of the class is used (if there's just one)
+	for comment, scope, name in entry['properties']:
+		className = classes[0][2] if len(classes) == 1 else None
+		lineNumber = classes[0][0] if len(classes) == 1 else 0
+		symbols.append(LibrarySymbol(path, name, name, comment, className, lineNumber, True))
+	return symbols
+
+# returns the name of the innermost class containing the line (or None)
+def getClassName(classes, lineNumber):
+	className = None
+	for startLine, endLine, name in classes:
+		if startLine <= lineNumber <= endLine:
+			className = name
+	return className
+
+# the whole name in lower case along with its humps e.g. 'gethttpvalue', 'get', 'http' and 'value'
+def getNameTokens(name):
+	tokens = set(getNameHumps(name))
+	tokens.add(name.lower())
+	return tokens
+
+def getWords(text):
+	if text == None:
+		return []
+	return [word.lower() for word in SYMBOL_WORD_REGEX.findall(text)]
+
+def removePostings(postings, tokens, symbolId):
+	for token in set(tokens):
+		symbolIds = postings.get(token)
+		if symbolIds == None:
+			continue
+		symbolIds.discard(symbolId)
+		if len(symbolIds) == 0:
+			del postings[token]
+
+# returns the set of the symbols with a token starting with the prefix
+def getPrefixPostings(postings, sortedTokens, prefix):
+	start = bisect.bisect_left(sortedTokens, prefix)
+	end = bisect.bisect_left(sortedTokens, prefix + MAX_KEY_CHAR)
+	if end - start == 1:
+		return postings[sortedTokens[start]]
+	symbolIds = set()
+	for token in sortedTokens[start:end]:
+		symbolIds |= postings[token]
+	return symbolIds
+
+# the text shown for the symbol e.g. 'ClassName.getValue(a,b)'
+def formatSymbol(symbol):
+	if symbol.className == None:
+		return symbol.signature
+	return '%s.%s' % (symbol.className, symbol.signature)
+
+def main():
+	parser = argparse.ArgumentParser(description='searches the methods and properties in the index of a TestLibrary folder')
+	parser.add_argument('libraryDirPath', help='the TestLibrary folder (indexed with python -m VBScriptLibraryUtil.index)')
+	parser.add_argument('query', help='words of the names or descriptions of the methods')
+	parser.add_argument('--limit', type=int, default=20, help='most results shown')
+	args = parser.parse_args()
+
+	if not os.path.isdir(args.libraryDirPath):
+		parser.error('%s is not a folder' % args.libraryDirPath)
+	start = time.perf_counter()
+	symbolIndex = SymbolIndex(args.libraryDirPath)
+	symbolIndex.update(LibraryIndex(args.libraryDirPath), [path for path, lastModified, size in \
+		iterLibraryFiles(args.libraryDirPath)])
+	built = time.perf_counter()
+	results = symbolIndex.search(args.query, args.limit)
+	searched = time.perf_counter()
+
+	for symbol in results:
+		sys.stdout.write('%s:%d  %s\n' % (os.path.relpath(symbol.path, args.libraryDirPath), symbol.lineNumber, \
+			formatSymbol(symbol)))
+		if symbol.description != None:
+			sys.stdout.write('    %s\n' % symbol.description)
+	sys.stdout.write('\n%d symbols indexed in %.1fms, searched in %.2fms\n' % (len(symbolIndex), \
+		(built - start) * 1000, (searched - built) * 1000))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,65 @@
+# pool of background threads used to parse libraries off the completion path
+
+import threading, itertools, traceback, queue
+
+# tasks for the libraries of the view the user is looking at are run before all others
+PRIORITY_VISIBLE = 0
+PRIORITY_BACKGROUND = 1
+
+class BackgroundParser(object):
+	# shared by all the event listeners so that a library is only ever parsed by one thread
+	instance = None
+
+	def __init__(self, numWorkers=2):
+		self.numWorkers = numWorkers
+		# of the form (priority, order, key, task) so that tasks of the same priority run in the order added
+		self.tasks = queue.PriorityQueue()
+		# of the form {key:priority, ...} for the tasks that are waiting to be run
+		self.pending = {}
+		self.lock = threading.Lock()
+		self.order = itertools.count()
+		self.threads = []
+
+	@classmethod
+	def getInstance(cls):
+		if cls.instance == None:
+			cls.instance = BackgroundParser()
+		return cls.instance
+
+	# adds the task to the queue (unless one with the same key is already waiting with the same or a 
+	# better priority) returns True if the task was added
+	def submit(self, key, task, priority=PRIORITY_BACKGROUND):
+		with self.lock:
+			if (key in self.pending) and (self.pending[key] <= priority):
+				return False
+			self.pending[key] = priority
+			self.tasks.put((priority, next(self.order), key, task))
+			self.startWorkers()
+		return True
+
+	# blocks until every task that has been submitted has been run (including the tasks they submit)
+	def waitForTasks(self):
+		self.tasks.join()
+
+	def startWorkers(self):
+		while len(self.threads) < self.numWorkers:
+			thread = threading.Thread(target=self.runTasks, name='VBScriptLibraryParser-%d' % len(self.threads))
+			thread.daemon = True
+			thread.start()
+			self.threads.append(thread)
+
+	def runTasks(self):
+		while True:
+			priority, order, key, task = self.tasks.get()
+			try:
+				with self.lock:
+					# skips tasks that have already been run because they were re-added with a better priority
+					if self.pending.get(key) != priority:
+						continue
+					del self.pending[key]
+				task()
+			except Exception:
+				# a library that can't be parsed shouldn't stop the others from being parsed
+				traceback.print_exc()
+			finally:
+				self.tasks.task_done()
@@ -0,0 +1,92 @@
+# compares VBScriptLibraryUtil.declarations.scanDeclarations() with the whole string regexes that 
+# Libraries.extractMethods() and extractProperties() used to run on class strings with heavy comments
+#
+# usage: python benchmarks/bench_declarations.py [maxLines]
+
+import os, sys, re, time
+
+# allows the modules in the parent folder to be imported no matter where this is run from
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if not path in sys.path:
+	sys.path.insert(1, path)
+del path
+
+from VBScriptLibraryUtil import declarations
+
+LEGACY_METHODS_REGEX = re.compile('((\\s*\'.*\\n)*)^\\s*(\\bPrivate\\b|\\bPublic\\b|)\\s*' \
+	+ '(\\bFunction\\b|\\bSub\\b|\\bProperty\\b\\s*(\\bLet\\b|\\bSet\\b|\\bGet\\b))\\s*(' \
+	+ declarations.VBSCRIPT_ALLOW_VAR_NAME_REGEX + ')\\s*(\\([a-zA-Z0-9\\,\\s]*\\))?$', \
+	re.IGNORECASE | re.MULTILINE)
+LEGACY_PROPERTIES_REGEX = re.compile('((\\s*\'.*\\n)*)^\\s*(\\bPrivate\\b|\\bPublic\\b)\\s*(' \
+	+ declarations.VBSCRIPT_ALLOW_VAR_NAME_REGEX + ')\\s*$', re.IGNORECASE | re.MULTILINE)
+
+# the old whole string search (the declaration line is re-matched so the same formatting is used)
+def legacyScanDeclarations(content):
+	methods = []
+	for match in LEGACY_METHODS_REGEX.finditer(content):
+		line = match.group(0)[len(match.group(1)):]
+		methods.append(declarations.formatMethodStr(match.group(1), \
+			declarations.METHOD_DECLARATION_REGEX.match(line)))
+
+	properties = []
+	for match in LEGACY_PROPERTIES_REGEX.finditer(content):
+		line = match.group(0)[len(match.group(1)):]
+		properties.append(declarations.formatPropertyStr(match.group(1), \
+			declarations.PROPERTY_DECLARATION_REGEX.match(line)))
+	return methods, properties
+
+# builds a class string (as returned by returnClassString()) of about numLines lines where most of
+# the lines are comment banners and many of the banners are above code that isn't a declaration
+def buildCommentHeavyClassString(numLines, bannerLines=20):
+	lines = ['Class Heavy']
+	methodNo = 0
+	while len(lines) < numLines:
+		lines.extend(["'" + '#' * 60, "' Description: method %d does things" % methodNo, "' with a 'quoted' word"])
+		lines.extend(["' detail line %d of the banner" % i for i in range(bannerLines)])
+		lines.append("'" + '#' * 60)
+		if methodNo % 3 == 0:
+			lines.extend(['Public Function method%d(ByVal a, b)' % methodNo, 'method%d = "it\'s"' % methodNo, \
+				'End Function'])
+		elif methodNo % 3 == 1:
+			lines.extend(['Private value%d' % methodNo, 'x = 1 \' trailing comment'])
+		else:
+			lines.extend(['Dim notADeclaration%d' % methodNo])
+		methodNo += 1
+	lines.append('End Class')
+	return '\n'.join(lines) + '\n'
+
+def timeCall(function, content):
+	start = time.perf_counter()
+	result = function(content)
+	return time.perf_counter() - start, result
+
+def compare(label, content):
+	legacyTime, legacyResult = timeCall(legacyScanDeclarations, content)
+	scannerTime, scannerResult = timeCall(declarations.scanDeclarations, content)
+	if legacyResult != scannerResult:
+		raise AssertionError('scanDeclarations() results differ for %s' % label)
+
+	numLines = content.count('\n')
+	print('%10s %10d %12.4f %12.4f %10.2fus' % (label, numLines, legacyTime, scannerTime, \
+		1e6 * scannerTime / numLines))
+
+def main(maxLines):
+	header = '%10s %10s %12s %12s %12s' % ('', 'lines', 'regex (s)', 'scanner (s)', 'scanner/line')
+
+	# the size of the file grows with the same banners
+	print(header)
+	numLines = 1000
+	while numLines <= maxLines:
+		compare('banner=20', buildCommentHeavyClassString(numLines))
+		numLines *= 2
+
+	# the same size of file with longer banners (the regex backtracks over the whole of each banner)
+	print('')
+	print(header)
+	bannerLines = 20
+	while bannerLines <= 1280:
+		compare('banner=%d' % bannerLines, buildCommentHeavyClassString(min(maxLines, 20000), bannerLines))
+		bannerLines *= 4
+
+if __name__ == '__main__':
+	main(int(sys.argv[1]) if len(sys.argv) > 1 else 64000)
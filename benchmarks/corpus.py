@@ -0,0 +1,141 @@
+# generates synthetic VBScript/QFL libraries (and TestLibrary folders of them) for the benchmarks
+#
+# usage: python benchmarks/corpus.py <output TestLibrary folder> [numLibraries] [linesPerLibrary]
+
+import os, sys, random, codecs
+
+class CorpusOptions(object):
+	def __init__(self, lines=1000, classes=1, commentDensity=0.3, hashBanners=0.5, continuations=0.05, \
+		multiStatements=0.05, encoding='utf-8', imports=2, seed=0):
+		# approximate number of lines in each library
+		self.lines = lines
+		# number of classes in each library (the methods are shared between them)
+		self.classes = classes
+		# fraction of the methods with a comment banner above them
+		self.commentDensity = commentDensity
+		# fraction of the banners using the '#' and 'Description:' style of the Methods.qfl library
+		self.hashBanners = hashBanners
+		# fraction of the method declarations and statements split over lines with '_'
+		self.continuations = continuations
+		# fraction of the statements with a ':' joining them to another statement
+		self.multiStatements = multiStatements
+		# 'utf-8' or 'utf-16' (written with a BOM like QTP does)
+		self.encoding = encoding
+		# number of Import() statements at the top of each library
+		self.imports = imports
+		self.seed = seed
+
+# returns the text of a single library
+def generateLibrary(options, name='Generated', importPaths=None):
+	rand = random.Random('%s-%s' % (options.seed, name))
+	lines = []
+	lines.append("' %s library generated for the benchmarks" % name)
+	for i, importPath in enumerate(importPaths or []):
+		lines.append('Set lib%d = Import("%s")' % (i, importPath))
+	lines.append('Dim globalValue%s' % name)
+	lines.append('')
+
+	numClasses = max(1, options.classes)
+	# the lines are shared out between the classes
+	linesPerClass = max(20, (options.lines - len(lines)) // numClasses)
+	for classNo in range(numClasses):
+		className = '%sClass%d' % (name, classNo)
+		classLines = ['Class %s' % className]
+		classLines.append("\t' the name of the instance")
+		classLines.append('\tPublic name')
+		classLines.append('\tPrivate internalValue')
+		classLines.append('')
+
+		methodNo = 0
+		while len(classLines) < linesPerClass:
+			classLines.extend(generateMethod(rand, options, 'method%d' % methodNo))
+			methodNo += 1
+
+		classLines.append('End Class')
+		classLines.append('')
+		lines.extend(classLines)
+
+	return '\n'.join(lines) + '\n'
+
+def generateMethod(rand, options, methodName):
+	lines = []
+	if rand.random() < options.commentDensity:
+		if rand.random() < options.hashBanners:
+			lines.append("\t'" + '#' * 70)
+			lines.append("\t' Name: %s" % methodName)
+			lines.append("\t' Description: %s does some of the work" % methodName)
+			lines.append("\t'              over two lines of the description")
+			lines.append("\t' Params: a - the first value")
+			lines.append("\t'         b - the second value")
+			lines.append("\t' Returns: the 'result'")
+			lines.append("\t'" + '#' * 70)
+		else:
+			lines.append("\t' %s does some of the work" % methodName)
+			lines.append("\t' and returns the result")
+
+	methodType = rand.choice(['Function', 'Function', 'Sub', 'Property Get'])
+	scope = rand.choice(['Public', 'Public', 'Private', ''])
+	declaration = ('%s %s %s' % (scope, methodType, methodName)).strip()
+	if methodType == 'Property Get':
+		lines.append('\t%s' % declaration)
+	elif rand.random() < options.continuations:
+		lines.append('\t%s(ByVal a, _' % declaration)
+		lines.append('\t\tb)')
+	else:
+		lines.append('\t%s(ByVal a, b)' % declaration)
+
+	for statementNo in range(rand.randint(3, 12)):
+		variable = 'v%d' % statementNo
+		if rand.random() < options.multiStatements:
+			lines.append('\t\tDim %s : %s = "it\'s: %d"' % (variable, variable, statementNo))
+		elif rand.random() < options.continuations:
+			lines.append('\t\t%s = a & _' % variable)
+			lines.append('\t\t\t"continued"')
+		elif statementNo % 4 == 0:
+			lines.append('\t\tIf a > %d Then ' % statementNo)
+			lines.append('\t\t\t%s = b \' trailing comment' % variable)
+			lines.append('\t\tEnd If')
+		else:
+			lines.append('\t\t%s = a + %d' % (variable, statementNo))
+
+	if methodType == 'Function':
+		lines.append('\t\t%s = v0' % methodName)
+		lines.append('\tEnd Function')
+	elif methodType == 'Sub':
+		lines.append('\tEnd Sub')
+	else:
+		lines.append('\t\t%s = v0' % methodName)
+		lines.append('\tEnd Property')
+	lines.append('')
+	return lines
+
+def writeLibrary(path, text, encoding='utf-8'):
+	directory = os.path.dirname(path)
+	if (len(directory) > 0) and not os.path.isdir(directory):
+		os.makedirs(directory)
+	# the utf-16 codec writes the BOM
+	with codecs.open(path, 'w', encoding) as f:
+		f.write(text)
+
+# writes numLibraries libraries into a TestLibrary folder (spread over a few sub folders, each 
+# importing some of the ones before it) returns the list of their relative paths (without extensions)
+def generateLibraryTree(libraryDirPath, numLibraries, options):
+	relativePaths = []
+	for libraryNo in range(numLibraries):
+		name = 'Lib%d' % libraryNo
+		relativePath = 'folder%d/%s' % (libraryNo % 5, name.lower())
+		importPaths = relativePaths[-options.imports:] if options.imports > 0 else []
+		extension = '.qfl' if libraryNo % 2 else '.vbs'
+		writeLibrary(os.path.join(libraryDirPath, relativePath + extension), \
+			generateLibrary(options, name, importPaths), options.encoding)
+		relativePaths.append(relativePath)
+	return relativePaths
+
+if __name__ == '__main__':
+	if len(sys.argv) < 2:
+		print('usage: python benchmarks/corpus.py <output TestLibrary folder> [numLibraries] [linesPerLibrary]')
+		sys.exit(1)
+	numLibraries = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+	lines = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+	paths = generateLibraryTree(sys.argv[1], numLibraries, CorpusOptions(lines=lines))
+	print('wrote %d libraries to %s' % (len(paths), sys.argv[1]))
@@ -0,0 +1,208 @@
+# times the parsers and the completion path on generated libraries from 1k to 100k lines and 
+# reports the throughput and peak memory of each stage
+#
+# usage: python benchmarks/run.py [--sizes 1000,10000,100000] [--repeat 3] [--encoding utf-16]
+
+import os, sys, time, shutil, tempfile, tracemalloc, argparse
+
+# allows the modules in the parent folder to be imported no matter where this is run from
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if not path in sys.path:
+	sys.path.insert(1, path)
+del path
+
+# uses the stub sublime modules when not run inside sublime
+try:
+	import sublime, sublime_plugin
+except ImportError:
+	sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stubs'))
+	import sublime, sublime_plugin
+
+import ImportDetails
+import Libraries
+import corpus
+from VBScriptLibraryUtil.index import INDEX_FILE_NAME
+
+DRIVER_SCRIPT_NAME = 'driver.vbs'
+LIBRARY_NAME = 'generated'
+
+# just enough of a sublime view for Libraries.ImportedClassesMethods.on_query_completions()
+class BenchmarkView(object):
+	def __init__(self, path, text):
+		self.path = path
+		self.text = text
+		self.regions = {}
+
+	def id(self):
+		return 1
+
+	def buffer_id(self):
+		return 1
+
+	def file_name(self):
+		return self.path
+
+	def size(self):
+		return len(self.text)
+
+	def change_count(self):
+		return 0
+
+	def substr(self, region):
+		return self.text[max(0, region.begin()):region.end()]
+
+	def sel(self):
+		return [sublime.Region(len(self.text))]
+
+	def word(self, region):
+		start = region.begin()
+		end = start
+		while (start > 0) and (self.text[start - 1].isalnum() or self.text[start - 1] == '_'):
+			start -= 1
+		while (end < len(self.text)) and (self.text[end].isalnum() or self.text[end] == '_'):
+			end += 1
+		return sublime.Region(start, end)
+
+	def full_line(self, region):
+		start = self.text.rfind('\n', 0, region.begin()) + 1
+		end = self.text.find('\n', region.end())
+		return sublime.Region(start, len(self.text) if end == -1 else end + 1)
+
+	def add_regions(self, key, regions, scope='', icon='', flags=0):
+		self.regions[key] = list(regions)
+
+	def get_regions(self, key):
+		return self.regions.get(key, [])
+
+class Benchmark(object):
+	def __init__(self, libraryDirPath, numLines, encoding):
+		self.libraryDirPath = libraryDirPath
+		self.libraryPath = os.path.join(libraryDirPath, LIBRARY_NAME + '.qfl')
+		options = corpus.CorpusOptions(lines=numLines, classes=max(1, numLines // 5000), encoding=encoding)
+		self.text = corpus.generateLibrary(options, LIBRARY_NAME)
+		corpus.writeLibrary(self.libraryPath, self.text, encoding)
+		self.numLines = self.text.count('\n')
+		self.classString = Libraries.returnClassString(self.libraryPath)
+		self.globalScope = ImportDetails.parseVBScriptText(self.text)[0]
+		self.view = BenchmarkView(os.path.join(libraryDirPath, DRIVER_SCRIPT_NAME), \
+			'Set lib = Import("%s")\nlib.' % LIBRARY_NAME)
+
+	# the stages that are timed of the form [(name, function), ...]
+	def getStages(self):
+		return [
+			('getVBScriptLines', lambda: ImportDetails.getVBScriptLines(self.libraryPath)),
+			('parseVBScriptLibrary', lambda: ImportDetails.parseVBScriptLibrary(self.libraryPath)),
+			('returnClassString', lambda: Libraries.returnClassString(self.libraryPath)),
+			('extractMethods', lambda: Libraries.extractMethods(self.classString)),
+			('extractImports', lambda: Libraries.extractImports(self.text)),
+			('resolveAll', self.resolveAllValues),
+			('completion (cold)', self.coldCompletion),
+			('completion (warm)', self.warmCompletion)
+		]
+
+	# the values of all the variables in the parsed library with a new resolver (so nothing is 
+	# memoized from the last run)
+	def resolveAllValues(self):
+		self.globalScope.resetScopeIndex()
+		self.globalScope.getExpressionResolver().resolveAll()
+
+	# a new listener with no persistent index (so the library is parsed as the background parser would)
+	def coldCompletion(self):
+		self.removeIndex()
+		listener = Libraries.ImportedClassesMethods()
+		listener.updateLibraryMethods(self.libraryDirPath, self.libraryPath)
+		return self.checkCompletions(listener.on_query_completions(self.view, '', [len(self.view.text)]))
+
+	# a new listener loading the library from the persistent index left by the cold completion
+	def warmCompletion(self):
+		self.clearCaches()
+		# the folder is scanned when the view is activated
+		Libraries.LibrarySnapshot.getSnapshot(self.libraryDirPath)
+		listener = Libraries.ImportedClassesMethods()
+		return self.checkCompletions(listener.on_query_completions(self.view, '', [len(self.view.text)]))
+
+	def checkCompletions(self, completions):
+		if len(completions) == 0:
+			raise AssertionError('no completions returned for the generated library')
+		return completions
+
+	# a new listener starts with nothing in the memory caches (as after a restart)
+	def clearCaches(self):
+		# the checks queued by the last stage would otherwise store their results in the cleared caches
+		Libraries.BackgroundParser.getInstance().waitForTasks()
+		Libraries.ImportedClassesMethods.libraryMethodDetails.clear()
+		Libraries.ImportedClassesMethods.viewCompletions.clear()
+		Libraries.ViewImportTable.tables.clear()
+		Libraries.LibrarySnapshot.snapshots.clear()
+		Libraries.LibraryDependencyGraph.graphs.clear()
+		Libraries.LibraryIndex.indexes.clear()
+		ImportDetails.LibraryDetailsCache.libraries.clear()
+
+	def removeIndex(self):
+		self.clearCaches()
+		indexPath = os.path.join(self.libraryDirPath, INDEX_FILE_NAME)
+		if os.path.isfile(indexPath):
+			os.remove(indexPath)
+
+# memory still allocated while the parsed library is kept (as it is in LibraryDetailsCache once
+# it's been used by both the completions and the expression resolver)
+def measureRetainedMemory(path):
+	tracemalloc.start()
+	try:
+		details = ImportDetails.LibraryDetails(path)
+		details.getContents()
+		details.getPublicDeclarations()
+		current, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	return current
+
+def timeStage(function, repeat):
+	best = None
+	for i in range(repeat):
+		start = time.perf_counter()
+		function()
+		elapsed = time.perf_counter() - start
+		best = elapsed if best == None else min(best, elapsed)
+	return best
+
+def measurePeakMemory(function):
+	tracemalloc.start()
+	try:
+		function()
+		current, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	return peak
+
+def main():
+	parser = argparse.ArgumentParser(description='benchmarks the VBScript library parsers')
+	parser.add_argument('--sizes', default='1000,10000,100000', help='comma separated library sizes in lines')
+	parser.add_argument('--repeat', type=int, default=3, help='runs of each stage (the fastest is reported)')
+	parser.add_argument('--encoding', default='utf-8', choices=['utf-8', 'utf-16'])
+	args = parser.parse_args()
+
+	# the library folder has to be called TestLibrary for the completions
+	tempDirPath = tempfile.mkdtemp()
+	libraryDirPath = os.path.join(tempDirPath, 'TestLibrary') + os.sep
+	os.makedirs(libraryDirPath)
+	Libraries.VBSCRIPT_LIBRARY_PARENT_FOLDER = os.sep + 'testlibrary' + os.sep
+
+	print('%-22s %9s %10s %12s %10s %12s' % ('stage', 'lines', 'time (s)', 'lines/s', 'MB/s', 'peak mem'))
+	try:
+		for numLines in [int(size) for size in args.sizes.split(',')]:
+			benchmark = Benchmark(libraryDirPath, numLines, args.encoding)
+			numBytes = os.path.getsize(benchmark.libraryPath)
+			for name, function in benchmark.getStages():
+				elapsed = timeStage(function, args.repeat)
+				peak = measurePeakMemory(function)
+				print('%-22s %9d %10.4f %12.0f %10.2f %10.1fMB' % (name, benchmark.numLines, elapsed, \
+					benchmark.numLines / elapsed, numBytes / elapsed / 1e6, peak / 1e6))
+			print('%-22s %9d %45.1fMB' % ('cached LibraryDetails', benchmark.numLines, \
+				measureRetainedMemory(benchmark.libraryPath) / 1e6))
+			print('')
+	finally:
+		shutil.rmtree(tempDirPath)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,48 @@
+# minimal stand in for the sublime module so the plugins can be imported and timed outside of sublime
+
+class Region(object):
+	def __init__(self, a, b=None):
+		self.a = a
+		self.b = a if b == None else b
+
+	def begin(self):
+		return min(self.a, self.b)
+
+	def end(self):
+		return max(self.a, self.b)
+
+	def size(self):
+		return self.end() - self.begin()
+
+	def cover(self, region):
+		return Region(min(self.begin(), region.begin()), max(self.end(), region.end()))
+
+class Settings(dict):
+	def set(self, key, value):
+		self[key] = value
+
+	def add_on_change(self, key, callback):
+		pass
+
+	def clear_on_change(self, key):
+		pass
+
+HIDDEN = 128
+INHIBIT_WORD_COMPLETIONS = 8
+INHIBIT_EXPLICIT_COMPLETIONS = 16
+
+# the benchmarks run everything on the calling thread so the timings include the work
+def set_timeout(callback, delay=0):
+	callback()
+
+def set_timeout_async(callback, delay=0):
+	callback()
+
+def load_settings(name):
+	return Settings()
+
+def version():
+	return '4000'
+
+def active_window():
+	return None
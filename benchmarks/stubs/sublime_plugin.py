@@ -0,0 +1,19 @@
+# minimal stand in for the sublime_plugin module so the plugins can be imported outside of sublime
+
+class EventListener(object):
+	pass
+
+class ViewEventListener(object):
+	def __init__(self, view):
+		self.view = view
+
+class TextChangeListener(object):
+	pass
+
+class WindowCommand(object):
+	def __init__(self, window):
+		self.window = window
+
+class TextCommand(object):
+	def __init__(self, view):
+		self.view = view